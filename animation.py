@@ -1,132 +1,32 @@
 import pygame
-import random
 import math
+import itertools
+import functools
+import time
+
+import numpy as np
+
+from physics import (
+    WIDTH, HEIGHT, EPSILON,
+    initialize_particles, max_speed, handle_wall_collisions,
+)
+from forces import compute_forces
+from collisions import compute_collisions
+from integrators import make_integrator
+from profiler import FrameProfiler
+from trails import TrailBuffer
+from worker import PhysicsWorker
 
 # Constants
-WIDTH, HEIGHT = 1280, 720
-TIME_STEP = 5  # Time step for updates
-MAX_FORCE = 1e9  # Maximum allowable force for smoother movement
-K_COULOMB = 8.9875e9  # Coulomb's constant (in N·m²/C²)
-DAMPING_WALL = 0.99
-DAMPING_OBJECT = 0.99
-EPSILON = 1e-7  # To avoid division by zero
-
-# Particle class
-class Particle:
-    def __init__(self, x, y, mass, radius):
-        self.x = x
-        self.y = y
-        self.mass = mass
-        self.radius = radius
-        self.fx = 0  # Force in x direction
-        self.fy = 0  # Force in y direction
-        self.vx = 0  # Velocity in x direction
-        self.vy = 0  # Velocity in y direction
-
-# Initializing particles
-def initialize_particles(count, radius):
-    particles = []
-    mass = 1e12  # Assign same mass to all particles
-    for _ in range(count):
-        x = random.uniform(radius, WIDTH - radius)
-        y = random.uniform(radius, HEIGHT - radius)
-        particles.append(Particle(x, y, mass, radius))
-    return particles
-
-# Compute pairwise forces
-def compute_all_pairwise_forces(particles):
-    for i in range(len(particles) - 1):
-        for j in range(i + 1, len(particles)):
-            p1, p2 = particles[i], particles[j]
-            dx = p2.x - p1.x
-            dy = p2.y - p1.y
-            distance_squared = dx**2 + dy**2 + EPSILON
-            distance = math.sqrt(distance_squared)
-
-            if distance < p1.radius + p2.radius:
-                continue  # Skip overlapping particles
-
-            force = K_COULOMB * p1.mass * p2.mass / distance_squared
-            force = min(force, MAX_FORCE)
-
-            fx = force * dx / distance
-            fy = force * dy / distance
-
-            p1.fx += fx
-            p1.fy += fy
-            p2.fx -= fx
-            p2.fy -= fy
-
-# Update particles with velocity and forces
-def update_particles(particles):
-    for p in particles:
-        p.vx += (p.fx / p.mass) * TIME_STEP
-        p.vy += (p.fy / p.mass) * TIME_STEP
-        p.x += p.vx * TIME_STEP
-        p.y += p.vy * TIME_STEP
-        p.fx = p.fy = 0  # Reset forces
-
-# Handle collisions between particles
-def handle_collisions(particles):
-    for i in range(len(particles) - 1):
-        for j in range(i + 1, len(particles)):
-            p1, p2 = particles[i], particles[j]
-            dx = p2.x - p1.x
-            dy = p2.y - p1.y
-            distance_squared = dx**2 + dy**2
-            distance = math.sqrt(distance_squared)
-
-            if distance < p1.radius + p2.radius:  # Collision detected
-                overlap = p1.radius + p2.radius - distance
-                inv_distance = 1 / distance if distance > 0 else 0
-                resolve_x = dx * inv_distance * overlap / 2
-                resolve_y = dy * inv_distance * overlap / 2
-                p1.x -= resolve_x
-                p1.y -= resolve_y
-                p2.x += resolve_x
-                p2.y += resolve_y
-
-                # Compute normal and tangential directions
-                normal_x = dx * inv_distance
-                normal_y = dy * inv_distance
-                tangent_x = -normal_y
-                tangent_y = normal_x
-
-                # Apply velocities onto normal and tangential directions
-                v1n = p1.vx * normal_x + p1.vy * normal_y
-                v2n = p2.vx * normal_x + p2.vy * normal_y
-                v1t = p1.vx * tangent_x + p1.vy * tangent_y
-                v2t = p2.vx * tangent_x + p2.vy * tangent_y
-
-                # Apply conservation of momentum to normal components
-                m1, m2 = p1.mass, p2.mass
-                v1n_new = ((v1n * (m1 - m2) + 2 * m2 * v2n) / (m1 + m2)) * DAMPING_OBJECT
-                v2n_new = ((v2n * (m2 - m1) + 2 * m1 * v1n) / (m1 + m2)) * DAMPING_OBJECT
-
-                # Updated normal and unchanged tangential components
-                p1.vx = v1t * tangent_x + v1n_new * normal_x
-                p1.vy = v1t * tangent_y + v1n_new * normal_y
-                p2.vx = v2t * tangent_x + v2n_new * normal_x
-                p2.vy = v2t * tangent_y + v2n_new * normal_y
-
-# Handle collisions with walls
-def handle_wall_collisions(particles):
-    for p in particles:
-        if p.x - p.radius < 0:  # Left wall
-            p.vx = -p.vx * DAMPING_WALL
-            p.x = p.radius
-
-        elif p.x + p.radius > WIDTH:  # Right wall
-            p.vx = -p.vx * DAMPING_WALL
-            p.x = WIDTH - p.radius
-
-        if p.y - p.radius < 0:  # Top wall
-            p.vy = -p.vy * DAMPING_WALL
-            p.y = p.radius
-
-        elif p.y + p.radius > HEIGHT:  # Bottom wall
-            p.vy = -p.vy * DAMPING_WALL
-            p.y = HEIGHT - p.radius
+FORCE_BACKEND = "numpy"  # One of forces.FORCE_BACKENDS
+COLLISION_BACKEND = "grid"  # One of collisions.COLLISION_BACKENDS
+INTEGRATOR = "euler"  # One of integrators.INTEGRATORS
+SHOW_PROFILER = False  # Frame timing overlay, toggled with P
+TRAIL_RENDERER = "polygons"  # "polygons" (one polygon per segment) or "sprites" (batched blits, approximate look)
+FRAME_BUDGET_MS = 1000 / 60
+PHYSICS_RATE = 60  # Physics steps per second of wall-clock time, independent of the frame rate
+MAX_FRAME_TIME = 0.25  # Longest wall-clock gap the physics catches up on in one frame
+PHYSICS_WORKER = None  # None (physics in the render loop), "process" or "thread"
 
 # Main menu
 def menu():
@@ -256,29 +156,141 @@ def draw_reset_button(screen, is_hovered):
     ]
     pygame.draw.polygon(screen, button_color, arrow_points)
 
+# Comet-like trails, one polygon per segment
+def draw_trail_polygons(trail_surface, trails):
+    trail_length = len(trails)
+    if trail_length < 2:
+        return
+    segments = [segment.tolist() for segment in trails.segments()]  # Only the stored points, oldest first
+    for parts in zip(*segments):
+        trail = [point for part in parts for point in part]
+        for i in range(trail_length - 1, 0, -1):
+            x1, y1, radius1 = trail[i]
+            x2, y2, radius2 = trail[i - 1]
+            alpha = int(255 * (i / trail_length))
+
+            width1 = radius1 * ((i / trail_length) ** 0.5)
+            width2 = radius2 * (((i - 1) / trail_length) ** 0.5)
+
+            # Trail color transition from red to blue
+            red = 255 - int(255 * (i / trail_length))
+            blue = int(255 * (i / trail_length))
+            trail_color = (red, 0, blue)
+
+            pygame.draw.polygon(
+                trail_surface,
+                trail_color + (alpha,),
+                [
+                    (x1 - width1, y1), (x1 + width1, y1),
+                    (x2 + width2, y2), (x2 - width2, y2),
+                ],
+            )
+
+# Comet-like trails stamped from cached sprites, one batched blit call per trail index. An approximation of
+# the polygons: round max-blended stamps instead of alpha-composited ribbon quads.
+class TrailSprites:
+    def __init__(self):
+        self.ramps = {}  # (trail length, radius) -> [(sprite, half width)] per trail index
+
+    # Sprites for each trail index, following the polygons' width, color and alpha ramp
+    def ramp(self, trail_length, radius):
+        key = (trail_length, radius)
+        if key not in self.ramps:
+            ramp = []
+            for i in range(trail_length):
+                width = max(1, round(radius * ((i / trail_length) ** 0.5)))
+                red = 255 - int(255 * (i / trail_length))
+                blue = int(255 * (i / trail_length))
+                sprite = pygame.Surface((2 * width, 2 * width), pygame.SRCALPHA)
+                pygame.draw.circle(sprite, (red, 0, blue, int(255 * (i / trail_length))), (width, width), width)
+                ramp.append((sprite, width))
+            self.ramps[key] = ramp
+        return self.ramps[key]
+
+    def draw(self, trail_surface, trails):
+        trail_length = len(trails)
+        if trail_length < 2:
+            return
+        # One (count, 3) view into the ring buffer per trail index, oldest point first
+        points = [segment[:, k] for segment in trails.segments() for k in range(segment.shape[1])]
+        # Per-channel max instead of alpha blending, so overlapping stamps don't build up opacity
+        no_area = itertools.repeat(None)
+        max_blend = itertools.repeat(pygame.BLEND_RGBA_MAX)
+        radii = points[-1][:, 2]
+        sizes = np.unique(radii).tolist()
+        for radius in sizes:
+            members = slice(None) if len(sizes) == 1 else radii == radius
+            ramp = self.ramp(trail_length, radius)
+            previous = points[0][members, :2]
+            for i in range(1, trail_length):
+                sprite, width = ramp[i]
+                current = points[i][members, :2]
+                # Stamp each point, plus the midpoint towards the previous one where the sprites would leave a gap
+                gaps = np.abs(current - previous).max(axis=1)
+                midpoints = (current[gaps > width] + previous[gaps > width]) / 2
+                previous = current
+                for centers in (midpoints, current):
+                    corners = (centers - width).astype(np.int32).tolist()
+                    trail_surface.blits(zip(itertools.repeat(sprite), corners, no_area, max_blend), doreturn=False)
+
+# Frame timing overlay: recent mean per phase, with a bar against the 60 FPS frame budget
+def draw_profiler_overlay(screen, profiler, font):
+    summary = profiler.summary()
+    panel = pygame.Surface((320, 22 * len(summary) + 10), pygame.SRCALPHA)
+    panel.fill((0, 0, 0, 160))
+    for i, (name, stats) in enumerate(summary.items()):
+        y = 5 + 22 * i
+        name_text = font.render(name, True, (255, 255, 255))
+        time_text = font.render(f"{stats['mean_ms']:.2f} ms", True, (255, 255, 255))
+        panel.blit(name_text, (5, y))
+        panel.blit(time_text, (185 - time_text.get_width(), y))
+        bar_width = int(120 * min(1.0, stats["mean_ms"] / FRAME_BUDGET_MS))
+        pygame.draw.rect(panel, (50, 205, 50), (195, y + 3, bar_width, 12))
+    screen.blit(panel, (WIDTH - panel.get_width() - 10, 10))
+
 # Main simulation loop
 def run_simulation(particle_count, radius):
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     clock = pygame.time.Clock()
     particles = initialize_particles(particle_count, radius)
+    integrator = make_integrator(INTEGRATOR, functools.partial(compute_forces, backend=FORCE_BACKEND))
 
-    # Trails dictionary for particles
-    trails = {p: [] for p in particles}
+    max_trail_length = 50  # To limit max trail length
+    trails = TrailBuffer(len(particles), max_trail_length)  # Trails for particles, indexed like the particle store
     dragged_particle = None  # Ensures that the particle stays under the cursor
 
     trail_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)  # For smooth surface for trails
-    max_trail_length = 50  # To limit max trail length
+    trail_sprites = TrailSprites()  # Cached sprite ramps for the batched trail renderer
 
     paused = False  # Pause/play
     running = True
 
+    # Fixed-timestep accumulator: physics advances by wall-clock time, drawing interpolates between steps
+    step_interval = 1 / PHYSICS_RATE
+    accumulator = 0.0
+    previous_time = time.perf_counter()
+    previous_x, previous_y = particles.x.copy(), particles.y.copy()  # Positions before the latest physics step
+
+    # Optional background physics: the loop below only reads its snapshots and forwards input
+    worker = None
+    if PHYSICS_WORKER:
+        worker = PhysicsWorker(
+            particles, radius, FORCE_BACKEND, COLLISION_BACKEND, PHYSICS_RATE, use_thread=PHYSICS_WORKER == "thread",
+            integrator=INTEGRATOR,
+        ).start()
+
+    profiler = FrameProfiler()  # Per-phase frame timings
+    show_profiler = SHOW_PROFILER
+    profiler_font = pygame.font.Font(None, 22)
+
     # Initializing button press states
     back_button_pressed = False
     pause_button_pressed = False
     reset_button_pressed = False
 
     while running:
+        profiler.start_frame()
         screen.fill((0, 0, 0))  # Clear the main screen
 
         #  To get the current mouse position
@@ -292,12 +304,18 @@ def run_simulation(particle_count, radius):
         # Handle events
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                if worker:
+                    worker.stop()
                 pygame.quit()
                 exit()
 
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
+                    if worker:
+                        worker.stop()
                     return  # Back to the main menu
+                if event.key == pygame.K_p:
+                    show_profiler = not show_profiler  # Toggle the frame timing overlay
 
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 # Check if back button is being pressed
@@ -321,77 +339,105 @@ def run_simulation(particle_count, radius):
             elif event.type == pygame.MOUSEBUTTONUP:
                 # Trigger actions after the button releases
                 if back_button_pressed and back_hovered:
+                    if worker:
+                        worker.stop()
                     return  # Go back to the main menu
                 if pause_button_pressed and pause_hovered:
                     paused = not paused  # Pause/play
+                    if worker:
+                        worker.pause(paused)
                 if reset_button_pressed and reset_hovered:
                     particles = initialize_particles(particle_count, radius)  # Reset particles
-                    trails = {p: [] for p in particles}  # Reset trails
+                    previous_x, previous_y = particles.x.copy(), particles.y.copy()
+                    trails.reset()  # Reset trails
+                    integrator.reset()
+                    if worker:
+                        worker.reset(particles)
 
                 # Reset button press states
                 back_button_pressed = pause_button_pressed = reset_button_pressed = False
+                if worker and dragged_particle:
+                    worker.release()
                 dragged_particle = None  # Stop dragging particles
 
         # Keep the dragged particle under the cursor
         if dragged_particle:
             dragged_particle.x, dragged_particle.y = mouse_x, mouse_y
-
-        # Update simulation only if not paused
-        if not paused:
-            compute_all_pairwise_forces(particles)
-            max_speed = max(math.sqrt(p.vx ** 2 + p.vy ** 2) for p in particles)
-            global TIME_STEP  # Update time step dynamically
-            TIME_STEP = min(5, radius / (max_speed + EPSILON))
-            update_particles(particles)
-            handle_collisions(particles)
-            handle_wall_collisions(particles)
-
-            # Update trails
-            for p in particles:
-                trails[p].append((p.x, p.y, p.radius))
-                if len(trails[p]) > max_trail_length:
-                    trails[p].pop(0)
+            previous_x[dragged_particle.index], previous_y[dragged_particle.index] = mouse_x, mouse_y
+            if worker:
+                worker.drag(dragged_particle.index, mouse_x, mouse_y)
+        profiler.lap("events")
+
+        # Run as many physics steps as the wall-clock time since the last frame calls for
+        now = time.perf_counter()
+        frame_time = min(now - previous_time, MAX_FRAME_TIME)
+        previous_time = now
+
+        if worker:
+            # Take the worker's latest state, there is nothing to interpolate against
+            if worker.read(particles):
+                trails.push(particles.x, particles.y, particles.radius)
+            previous_x[:] = particles.x
+            previous_y[:] = particles.y
+            profiler.lap("snapshot")
+        elif not paused:  # Update simulation only if not paused
+            accumulator += frame_time
+            while accumulator >= step_interval:
+                accumulator -= step_interval
+                previous_x[:] = particles.x
+                previous_y[:] = particles.y
+                if dragged_particle:
+                    dragged_particle.x, dragged_particle.y = mouse_x, mouse_y
+
+                time_step = min(5, radius / (max_speed(particles) + EPSILON))  # Update time step dynamically
+                integrator.begin(particles, time_step)
+                profiler.lap("integrate")
+                compute_forces(particles, FORCE_BACKEND)
+                profiler.lap("forces")
+                integrator.finish(particles, time_step)
+                profiler.lap("integrate")
+                compute_collisions(particles, COLLISION_BACKEND)
+                profiler.lap("collisions")
+                handle_wall_collisions(particles)
+                profiler.lap("walls")
+
+                # Update trails
+                trails.push(particles.x, particles.y, particles.radius)
+                profiler.lap("trail update")
+
+        # Draw positions between the last two physics steps, by how far we are into the next one
+        blend = 1.0 if paused else accumulator / step_interval
+        draw_x = previous_x + (particles.x - previous_x) * blend
+        draw_y = previous_y + (particles.y - previous_y) * blend
 
         # To draw comet-like trails
         trail_surface.fill((0, 0, 0, 0))  # Clear trail surface
-        for p in particles:
-            if len(trails[p]) > 1:
-                for i in range(len(trails[p]) - 1, 0, -1):
-                    x1, y1, radius1 = trails[p][i]
-                    x2, y2, radius2 = trails[p][i - 1]
-                    alpha = int(255 * (i / len(trails[p])))
-
-                    width1 = radius1 * ((i / len(trails[p])) ** 0.5)
-                    width2 = radius2 * (((i - 1) / len(trails[p])) ** 0.5)
-
-                    # Trail color transition from red to blue
-                    red = 255 - int(255 * (i / len(trails[p])))
-                    blue = int(255 * (i / len(trails[p])))
-                    trail_color = (red, 0, blue)
-
-                    pygame.draw.polygon(
-                        trail_surface,
-                        trail_color + (alpha,),
-                        [
-                            (x1 - width1, y1), (x1 + width1, y1),
-                            (x2 + width2, y2), (x2 - width2, y2),
-                        ],
-                    )
+        if TRAIL_RENDERER == "sprites":
+            trail_sprites.draw(trail_surface, trails)
+        else:
+            draw_trail_polygons(trail_surface, trails)
         screen.blit(trail_surface, (0, 0))  # Add trails to the main screen
+        profiler.lap("trail render")
 
         # Draw particles with color based on speed
-        for p in particles:
+        for p, x, y in zip(particles, draw_x.tolist(), draw_y.tolist()):
             speed_squared = p.vx ** 2 + p.vy ** 2
             color_intensity = min(255, int(0.5 * p.mass * speed_squared * math.sqrt(1e-9 * 1e-10)))
             color = (color_intensity, 0, 255 - color_intensity)
-            pygame.draw.circle(screen, color, (int(p.x), int(p.y)), p.radius)
+            pygame.draw.circle(screen, color, (int(x), int(y)), p.radius)
+        profiler.lap("particle render")
 
         # Draw buttons
         draw_back_button(screen, back_hovered)
         draw_pause_play_button(screen, paused, pause_hovered)
         draw_reset_button(screen, reset_hovered)
+        if show_profiler:
+            draw_profiler_overlay(screen, profiler, profiler_font)
+        profiler.lap("overlay")
 
         pygame.display.flip()
+        profiler.lap("flip")
+        profiler.end_frame()
         clock.tick(60)
 
     pygame.quit()
@@ -0,0 +1,175 @@
+import math
+
+import numpy as np
+
+from physics import WIDTH, HEIGHT, EPSILON, K_COULOMB, MAX_FORCE
+
+# Constants
+MAX_DEPTH = 16  # Quadtree levels, Morton keys use 2 bits per level
+LEAF_SIZE = 8  # Nodes with at most this many particles are summed directly
+CHUNK_SIZE = 2048  # Particles walked through the tree at once, bounds memory use
+
+# Spread the low 16 bits of v so that there is a zero bit between each of them
+def _spread_bits(v):
+    v = v.astype(np.uint64)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x33333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x55555555)
+    return v
+
+# Repeat each owner once per item in its [start, start + count) range
+def _expand(owner, start, count):
+    total = int(count.sum())
+    owner = np.repeat(owner, count)
+    offsets = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+    return owner, np.repeat(start, count) + offsets
+
+# Quadtree stored as flat node arrays over particles sorted by Morton key
+class QuadTree:
+    def __init__(self, x, y, mass):
+        # Root square covers the simulation domain and any particle outside it
+        x0, y0 = min(0.0, x.min()), min(0.0, y.min())
+        side = max(max(WIDTH, x.max()) - x0, max(HEIGHT, y.max()) - y0) * (1 + 1e-9)
+        cells = 1 << MAX_DEPTH
+        ix = np.clip(((x - x0) / side * cells).astype(np.int64), 0, cells - 1)
+        iy = np.clip(((y - y0) / side * cells).astype(np.int64), 0, cells - 1)
+        keys = _spread_bits(ix) | (_spread_bits(iy) << np.uint64(1))
+
+        self.order = np.argsort(keys, kind="stable")
+        keys = keys[self.order]
+        n = len(keys)
+
+        starts, counts, levels = [np.zeros(1, dtype=np.int64)], [np.array([n])], [np.zeros(1, dtype=np.int64)]
+        child_start, child_count = [], []
+        level_starts, level_counts, offset = starts[0], counts[0], 1
+        for level in range(MAX_DEPTH + 1):
+            internal = (level_counts > LEAF_SIZE) & (level < MAX_DEPTH)
+            first = np.zeros(len(level_counts), dtype=np.int64)
+            number = np.zeros(len(level_counts), dtype=np.int64)
+            if not internal.any():
+                child_start.append(first)
+                child_count.append(number)
+                break
+
+            # A child begins at each parent start and wherever the next level's key prefix changes
+            parent_starts = level_starts[internal]
+            parent_ends = parent_starts + level_counts[internal]
+            marks = np.zeros(n + 1, dtype=np.int64)
+            marks[parent_starts] += 1
+            np.subtract.at(marks, parent_ends, 1)
+            inside = np.cumsum(marks)[:n] > 0
+            prefix = keys >> np.uint64(2 * (MAX_DEPTH - level - 1))
+            boundary = np.ones(n, dtype=bool)
+            boundary[1:] = prefix[1:] != prefix[:-1]
+            boundary[parent_starts] = True
+            new_starts = np.flatnonzero(inside & boundary)
+
+            parent = np.searchsorted(parent_starts, new_starts, side="right") - 1
+            next_starts = np.append(new_starts[1:], n)
+            new_counts = np.minimum(next_starts, parent_ends[parent]) - new_starts
+
+            per_parent = np.bincount(parent, minlength=len(parent_starts))
+            first[internal] = offset + np.cumsum(per_parent) - per_parent
+            number[internal] = per_parent
+            child_start.append(first)
+            child_count.append(number)
+
+            starts.append(new_starts)
+            counts.append(new_counts)
+            levels.append(np.full(len(new_starts), level + 1, dtype=np.int64))
+            level_starts, level_counts = new_starts, new_counts
+            offset += len(new_starts)
+
+        self.start = np.concatenate(starts)
+        self.count = np.concatenate(counts)
+        self.child_start = np.concatenate(child_start)
+        self.child_count = np.concatenate(child_count)
+        self.width = side / (2.0 ** np.concatenate(levels))
+        self.is_leaf = self.child_count == 0
+
+        # Monopole moments from prefix sums over the sorted particles
+        sorted_mass = mass[self.order]
+        end = self.start + self.count
+        mass_sum = np.concatenate(([0.0], np.cumsum(sorted_mass)))
+        mx_sum = np.concatenate(([0.0], np.cumsum(sorted_mass * (x[self.order] - x0))))
+        my_sum = np.concatenate(([0.0], np.cumsum(sorted_mass * (y[self.order] - y0))))
+        self.mass = mass_sum[end] - mass_sum[self.start]
+        self.com_x = x0 + (mx_sum[end] - mx_sum[self.start]) / self.mass
+        self.com_y = y0 + (my_sum[end] - my_sum[self.start]) / self.mass
+
+# Barnes–Hut backend: cells that look smaller than theta from a particle act as one point mass
+def barnes_hut_forces(x, y, mass, radius, theta=0.5):
+    n = len(x)
+    fx = np.zeros(n)
+    fy = np.zeros(n)
+    if n < 2:
+        return fx, fy
+
+    tree = QuadTree(x, y, mass)
+    xs, ys = x[tree.order], y[tree.order]
+    ms, rs = mass[tree.order], radius[tree.order]
+    max_radius = rs.max()
+    sorted_fx = np.zeros(n)
+    sorted_fy = np.zeros(n)
+
+    for chunk_start in range(0, n, CHUNK_SIZE):
+        particle = np.arange(chunk_start, min(chunk_start + CHUNK_SIZE, n))
+        node = np.zeros(len(particle), dtype=np.int64)
+        while len(particle):
+            dx = tree.com_x[node] - xs[particle]
+            dy = tree.com_y[node] - ys[particle]
+            distance_squared = dx * dx + dy * dy + EPSILON
+            distance = np.sqrt(distance_squared)
+            width = tree.width[node]
+            leaf = tree.is_leaf[node]
+
+            # Far enough to approximate, and far enough that no member can overlap the particle
+            far = ~leaf & (width < theta * distance) & (distance - width * math.sqrt(2) >= rs[particle] + max_radius)
+            if far.any():
+                p, k = particle[far], node[far]
+                members = tree.count[k]
+                # Clamp the mean pair force, as the direct sum clamps each pair
+                force = members * np.minimum(K_COULOMB * ms[p] * (tree.mass[k] / members) / distance_squared[far], MAX_FORCE)
+                force /= distance[far]
+                sorted_fx += np.bincount(p, weights=force * dx[far], minlength=n)
+                sorted_fy += np.bincount(p, weights=force * dy[far], minlength=n)
+
+            if leaf.any():
+                p, j = _expand(particle[leaf], tree.start[node[leaf]], tree.count[node[leaf]])
+                pair_dx = xs[j] - xs[p]
+                pair_dy = ys[j] - ys[p]
+                pair_distance_squared = pair_dx * pair_dx + pair_dy * pair_dy + EPSILON
+                pair_distance = np.sqrt(pair_distance_squared)
+                force = np.minimum(K_COULOMB * ms[p] * ms[j] / pair_distance_squared, MAX_FORCE)
+                force[(pair_distance < rs[p] + rs[j]) | (p == j)] = 0  # Skip overlapping particles and self
+                force /= pair_distance
+                sorted_fx += np.bincount(p, weights=force * pair_dx, minlength=n)
+                sorted_fy += np.bincount(p, weights=force * pair_dy, minlength=n)
+
+            opened = ~leaf & ~far
+            particle, node = _expand(particle[opened], tree.child_start[node[opened]], tree.child_count[node[opened]])
+
+    fx[tree.order] = sorted_fx
+    fy[tree.order] = sorted_fy
+    return fx, fy
+
+# Error and timing report against the exact pairwise sum
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    from forces import compare_force_backends
+    from physics import initialize_particles
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    random.seed(0)
+    particles = initialize_particles(count, 5)
+    print(f"{'theta':>6} {'max rel':>10} {'rms rel':>10} {'time (s)':>9}")
+    for theta in (0.2, 0.3, 0.5, 0.7, 1.0):
+        start = time.perf_counter()
+        barnes_hut_forces(particles.x, particles.y, particles.mass, particles.radius, theta)
+        elapsed = time.perf_counter() - start
+        report = compare_force_backends(particles, "barnes_hut", reference="numpy", theta=theta)
+        print(f"{theta:>6} {report['max_rel_error']:>10.2e} {report['rms_rel_error']:>10.2e} {elapsed:>9.3f}")
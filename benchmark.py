@@ -0,0 +1,164 @@
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from forces import FORCE_BACKENDS
+from collisions import COLLISION_BACKENDS
+from headless import STAGES, run_headless
+from integrators import INTEGRATORS
+
+# Constants
+COUNTS = (10, 100, 1000, 10000, 100000)
+RADII = (2, 5)
+STEPS = 10
+SEED = 0
+SLOWDOWN_THRESHOLD = 0.10  # Relative increase in time that counts as a regression
+ENERGY_MAX_COUNT = 5000  # Energy drift needs an O(N²) energy sum, skipped above this count
+
+# Largest particle count worth running per backend (quadratic time or memory beyond this)
+MAX_COUNT = {
+    "python": 1000,
+    "numpy": 5000,
+    "tiled": 20000,
+    "tiled_symmetric": 20000,
+    "parallel": 20000,
+    "jit": 20000,
+    "particle_mesh": 20000,
+    "fmm": 20000,
+    "cutoff": 20000,
+    "all_pairs": 1000,
+    "sweep_and_prune": 20000,
+}
+
+# Time one configuration, then measure its peak traced memory with a separate short run
+def run_case(count, radius, force_backend, collision_backend, steps, seed, integrator="euler"):
+    _, stats = run_headless(
+        count, radius, steps, seed, force_backend, collision_backend,
+        # The energy sum is the full-range potential, which the cutoff model does not conserve
+        integrator=integrator, track_energy=count <= ENERGY_MAX_COUNT and force_backend != "cutoff",
+    )
+
+    tracemalloc.start()
+    run_headless(count, radius, 1, seed, force_backend, collision_backend, integrator=integrator)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_step = 1e9 / (steps * count)
+    return {
+        "count": count,
+        "radius": radius,
+        "force_backend": force_backend,
+        "collision_backend": collision_backend,
+        "integrator": integrator,
+        "steps": steps,
+        "seed": seed,
+        "steps_per_second": stats["steps_per_second"],
+        "simulated_time": stats["simulated_time"],
+        "energy_drift": stats.get("energy_drift"),  # None where the count is too large, or for the cutoff model
+        "ns_per_particle_step": {stage: seconds * per_step for stage, seconds in stats["stage_seconds"].items()},
+        "peak_memory_bytes": peak,
+        "collision_stats": stats.get("collision_stats"),
+    }
+
+# Run the full sweep and return the result document
+def run_suite(counts, radii, force_backends, collision_backends, steps, seed, integrators=("euler",)):
+    results = []
+    for count in counts:
+        for radius in radii:
+            for force_backend in force_backends:
+                for collision_backend in collision_backends:
+                    if count > min(MAX_COUNT.get(force_backend, count), MAX_COUNT.get(collision_backend, count)):
+                        continue
+                    for integrator in integrators:
+                        result = run_case(count, radius, force_backend, collision_backend, steps, seed, integrator)
+                        drift = result["energy_drift"]
+                        print(
+                            f"{count:>7} {radius:>5} {force_backend:>12} {collision_backend:>16} {integrator:>9} "
+                            f"{result['steps_per_second']:>10.2f} steps/s"
+                            + (f" {drift:>+11.3e} drift" if drift is not None else ""),
+                            flush=True,
+                        )
+                        results.append(result)
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+        },
+        "results": results,
+    }
+
+def _case_key(result):
+    return (
+        result["count"], result["radius"], result["force_backend"], result["collision_backend"],
+        result.get("integrator", "euler"),  # Older result files predate the integrator option
+    )
+
+# Compare two result documents, returning (case, metric, old, new) for every slowdown
+def compare_results(baseline, current, threshold=SLOWDOWN_THRESHOLD):
+    old_cases = {_case_key(result): result for result in baseline["results"]}
+    slowdowns = []
+    for result in current["results"]:
+        old = old_cases.get(_case_key(result))
+        if old is None:
+            continue
+        for stage in STAGES:
+            before = old["ns_per_particle_step"][stage]
+            after = result["ns_per_particle_step"][stage]
+            if after > before * (1 + threshold):
+                slowdowns.append((_case_key(result), stage + " ns/particle/step", before, after))
+        if result["steps_per_second"] < old["steps_per_second"] / (1 + threshold):
+            slowdowns.append((_case_key(result), "steps/s", old["steps_per_second"], result["steps_per_second"]))
+    return slowdowns
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the physics pipeline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmark sweep")
+    run_parser.add_argument("--counts", type=int, nargs="+", default=COUNTS)
+    run_parser.add_argument("--radii", type=float, nargs="+", default=RADII)
+    run_parser.add_argument("--forces", nargs="+", choices=FORCE_BACKENDS, default=list(FORCE_BACKENDS))
+    run_parser.add_argument("--collisions", nargs="+", choices=COLLISION_BACKENDS, default=list(COLLISION_BACKENDS))
+    run_parser.add_argument("--integrators", nargs="+", choices=INTEGRATORS, default=list(INTEGRATORS))
+    run_parser.add_argument("--steps", type=int, default=STEPS)
+    run_parser.add_argument("--seed", type=int, default=SEED)
+    run_parser.add_argument("--output", default="benchmark.json")
+
+    compare_parser = subparsers.add_parser("compare", help="flag slowdowns between two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=SLOWDOWN_THRESHOLD)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        document = run_suite(
+            args.counts, args.radii, args.forces, args.collisions, args.steps, args.seed, args.integrators,
+        )
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"Wrote {len(document['results'])} results to {args.output}")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    slowdowns = compare_results(baseline, current, args.threshold)
+    for case, metric, before, after in slowdowns:
+        count, radius, force_backend, collision_backend, integrator = case
+        print(f"SLOWER {count} particles, radius {radius}, {force_backend}/{collision_backend}/{integrator}: "
+              f"{metric} {before:.1f} -> {after:.1f}")
+    if slowdowns:
+        sys.exit(1)
+    print("No slowdowns")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+import math
+import time
+
+import numpy as np
+
+from jit import NUMBA_AVAILABLE, handle_collisions_jit
+from physics import (
+    handle_collisions, minimum_image, particle_arrays, resolve_candidate_pairs, resolve_collision, sweep_collisions,
+)
+
+# Handle collisions using a uniform grid broad phase
+def handle_collisions_grid(particles):
+    x, y, _, radius = particle_arrays(particles)
+    if len(x) < 2 or radius.max() <= 0:
+        return
+    xs, ys, radii = x.tolist(), y.tolist(), radius.tolist()
+
+    # Cells as wide as the largest contact distance, so touching particles are at most one cell apart
+    cell_size = 2 * max(radii)
+    cells = {}
+    cell_of = []
+    for i in range(len(xs)):
+        cell = (int(xs[i] // cell_size), int(ys[i] // cell_size))
+        cells.setdefault(cell, []).append(i)
+        cell_of.append(cell)
+
+    # Move a particle to the cell matching its corrected position
+    def rebin(i):
+        cell = (int(xs[i] // cell_size), int(ys[i] // cell_size))
+        if cell != cell_of[i]:
+            cells[cell_of[i]].remove(i)
+            cells.setdefault(cell, []).append(i)
+            cell_of[i] = cell
+            return True
+        return False
+
+    # Visit pairs in the same order as the all-pairs loop, using current positions
+    for i in range(len(xs) - 1):
+        last = i
+        moved = True
+        while moved:
+            moved = False
+            cx, cy = cell_of[i]
+            candidates = sorted(
+                j for nx in (cx - 1, cx, cx + 1) for ny in (cy - 1, cy, cy + 1)
+                for j in cells.get((nx, ny), ()) if j > last
+            )
+            for j in candidates:
+                dx = xs[j] - xs[i]
+                dy = ys[j] - ys[i]
+                distance = math.sqrt(dx**2 + dy**2)
+
+                if distance < radii[i] + radii[j]:  # Collision detected
+                    p1, p2 = particles[i], particles[j]
+                    resolve_collision(p1, p2, dx, dy, distance)
+                    xs[i], ys[i], xs[j], ys[j] = p1.x, p1.y, p2.x, p2.y
+                    rebin(j)
+                    if rebin(i):
+                        last = j  # Neighbourhood changed, gather the remaining candidates again
+                        moved = True
+                        break
+
+# Sweep-and-prune along x, keeping the sorted order between frames
+class SweepAndPrune:
+    def __init__(self):
+        self.particles = None
+        self.order = []  # Particle indices sorted by the left end of their x interval
+
+    def __call__(self, particles):
+        x, y, _, radius = particle_arrays(particles)
+        if len(x) < 2:
+            return
+        xs, ys, radii = x.tolist(), y.tolist(), radius.tolist()
+        starts = [xi - ri for xi, ri in zip(xs, radii)]
+        if particles is not self.particles or len(self.order) != len(x):
+            self.particles = particles  # New particle set, sort from scratch once
+            self.order = sorted(range(len(x)), key=starts.__getitem__)
+        reach = 2 * max(radii)  # No x interval is wider than this
+        order = self.order
+
+        # Insertion sort, cheap because particles move less than a radius per step
+        for k in range(1, len(order)):
+            item = order[k]
+            key = starts[item]
+            m = k - 1
+            while m >= 0 and starts[order[m]] > key:
+                order[m + 1] = order[m]
+                m -= 1
+            order[m + 1] = item
+        rank = [0] * len(order)
+        for k, item in enumerate(order):
+            rank[item] = k
+
+        # Slide one particle to its sorted place after its position changed
+        def reposition(i):
+            k = rank[i]
+            while k > 0 and starts[order[k - 1]] > starts[i]:
+                order[k] = order[k - 1]
+                rank[order[k]] = k
+                k -= 1
+            while k < len(order) - 1 and starts[order[k + 1]] < starts[i]:
+                order[k] = order[k + 1]
+                rank[order[k]] = k
+                k += 1
+            order[k] = i
+            rank[i] = k
+
+        # Later particles whose x interval overlaps particle i's
+        def overlapping(i, last):
+            end = xs[i] + radii[i]
+            found = []
+            k = rank[i] + 1
+            while k < len(order) and starts[order[k]] < end:
+                found.append(order[k])
+                k += 1
+            k = rank[i] - 1
+            while k >= 0 and starts[order[k]] > starts[i] - reach:
+                j = order[k]
+                if xs[j] + radii[j] > starts[i]:
+                    found.append(j)
+                k -= 1
+            return sorted(j for j in found if j > last)
+
+        # Visit pairs in the same order as the all-pairs loop, using current positions
+        for i in range(len(xs) - 1):
+            candidates = overlapping(i, i)
+            while candidates:
+                j = candidates.pop(0)
+                dx = xs[j] - xs[i]
+                dy = ys[j] - ys[i]
+                distance = math.sqrt(dx**2 + dy**2)
+
+                if distance < radii[i] + radii[j]:  # Collision detected
+                    p1, p2 = particles[i], particles[j]
+                    resolve_collision(p1, p2, dx, dy, distance)
+                    xs[i], ys[i], xs[j], ys[j] = p1.x, p1.y, p2.x, p2.y
+                    starts[i], starts[j] = xs[i] - radii[i], xs[j] - radii[j]
+                    reposition(i)
+                    reposition(j)
+                    candidates = overlapping(i, j)  # Particle i moved, its overlaps may have changed
+
+# Pairs (first < second) closer than radius[first] + radius[second] + margin, in all-pairs order,
+# found by sorting particles into cells as wide as the largest such distance. With a periodic box
+# (width, height), distances are to the nearest image.
+def close_pairs(x, y, radius, margin, box=None):
+    count = len(x)
+    cell_size = 2 * radius.max() + margin if count else 0.0  # Close pairs are at most one cell apart
+    if cell_size <= 0:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)  # Point particles never come close
+    if box is None:
+        cx = np.floor(x / cell_size).astype(np.int64)
+        cy = np.floor(y / cell_size).astype(np.int64)
+        cx -= cx.min() - 1
+        cy -= cy.min() - 1
+        stride = cy.max() + 2
+    else:
+        # Whole number of cells across the box, so the cells wrap around with it
+        cells_x = max(1, int(box[0] // cell_size))
+        cells_y = max(1, int(box[1] // cell_size))
+        cx = np.floor(x / (box[0] / cells_x)).astype(np.int64) % cells_x
+        cy = np.floor(y / (box[1] / cells_y)).astype(np.int64) % cells_y
+        stride = cells_y
+    key = cx * stride + cy
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+
+    firsts, seconds = [], []
+    for offset_x in (-1, 0, 1):
+        for offset_y in (-1, 0, 1):
+            if box is None:
+                target = key + offset_x * stride + offset_y
+            else:
+                target = (cx + offset_x) % cells_x * stride + (cy + offset_y) % cells_y
+            low = np.searchsorted(sorted_key, target, "left")
+            counts = np.searchsorted(sorted_key, target, "right") - low
+            first = np.repeat(np.arange(count), counts)
+            within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            second = order[np.repeat(low, counts) + within]
+            keep = first < second
+            first, second = first[keep], second[keep]
+            dx = x[second] - x[first]
+            dy = y[second] - y[first]
+            dx, dy = minimum_image(dx, dy, box)
+            reach = radius[first] + radius[second] + margin
+            close = dx * dx + dy * dy < reach * reach
+            firsts.append(first[close])
+            seconds.append(second[close])
+    first, second = np.concatenate(firsts), np.concatenate(seconds)
+    if box is not None:
+        # With fewer than three cells across, neighbouring cells repeat; unique also sorts the pairs
+        pairs = np.unique(first * count + second)
+        first, second = pairs // count, pairs % count
+    else:
+        pair_order = np.lexsort((second, first))
+        first, second = first[pair_order], second[pair_order]
+    return first, second
+
+# Verlet neighbor list: candidate pairs within r1 + r2 + skin, kept until some particle has moved
+# more than skin / 2 since the list was built, so no pair can come into contact unlisted.
+# With a cutoff it also lists the pairs within cutoff + skin for a short-range force model (pairs()),
+# so forces and collisions share one cell grid and one rebuild.
+class NeighborList:
+    def __init__(self, skin=None, cutoff=0.0):
+        self.skin = skin  # Defaults to the largest radius, or a fifth of the cutoff if that is larger
+        self.cutoff = cutoff
+        self.particles = None
+        self.box = None
+        self.first = self.second = None  # Candidate pairs (first < second) in all-pairs order
+        self.force_pairs = None  # (first, second) arrays within at least cutoff + skin
+        self.built_x = self.built_y = None  # Positions when the list was built
+        self.reset_stats()
+
+    # Counters cover one particle set, they restart when a new one comes in
+    def reset_stats(self):
+        self.frames = 0
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+        self.total_seconds = 0.0
+        self.candidate_pairs = 0  # Summed over frames
+
+    def _build(self, x, y, radius, skin, box):
+        start = time.perf_counter()
+        if self.cutoff:
+            # Reaching every contact too, then narrowed down to the collision candidates
+            reach = max(self.cutoff, 2 * float(radius.max())) + skin
+            first, second = close_pairs(x, y, np.zeros(len(x)), reach, box)
+            self.force_pairs = first, second
+            dx = x[second] - x[first]
+            dy = y[second] - y[first]
+            dx, dy = minimum_image(dx, dy, box)
+            reach = radius[first] + radius[second] + skin
+            contact = dx * dx + dy * dy < reach * reach
+            first, second = first[contact], second[contact]
+        else:
+            first, second = close_pairs(x, y, radius, skin, box)
+        self.first, self.second = first.tolist(), second.tolist()
+        self.built_x, self.built_y = x.copy(), y.copy()
+        self.rebuilds += 1
+        self.rebuild_seconds += time.perf_counter() - start
+
+    # Rebuild the lists if the particle set or box changed, or a particle moved too far
+    def _refresh(self, particles, box):
+        x, y, _, radius = particle_arrays(particles)
+        # The force pairs make rebuilds costly, so with a cutoff a wider skin pays for itself
+        skin = self.skin if self.skin is not None else max(float(radius.max()), self.cutoff / 5)
+        if particles is not self.particles or len(self.built_x) != len(x) or box != self.box:
+            self.particles = particles  # New particle set
+            self.box = box
+            self.reset_stats()
+            self._build(x, y, radius, skin, box)
+        else:
+            moved_x = x - self.built_x
+            moved_y = y - self.built_y
+            moved_x, moved_y = minimum_image(moved_x, moved_y, box)  # Wrapping around the box is not a move
+            if (moved_x * moved_x + moved_y * moved_y).max() > (skin / 2) ** 2:
+                self._build(x, y, radius, skin, box)
+
+    # Candidate pairs for the short-range force model, covering every pair within the cutoff
+    def pairs(self, particles, box=None):
+        if len(particles) < 2:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        start = time.perf_counter()
+        self._refresh(particles, box)
+        self.total_seconds += time.perf_counter() - start  # Rebuilds made here count towards the frame cost too
+        return self.force_pairs
+
+    # With a periodic box (width, height), pairs are listed and tested through their nearest images
+    def __call__(self, particles, box=None):
+        start = time.perf_counter()
+        if len(particles) < 2:
+            return
+        self._refresh(particles, box)
+        resolve_candidate_pairs(particles, zip(self.first, self.second), box=box)
+        self.frames += 1
+        self.candidate_pairs += len(self.first)
+        self.total_seconds += time.perf_counter() - start
+
+    # Rebuild count and the cost of rebuilding spread over all frames
+    def stats(self):
+        frames = max(1, self.frames)
+        return {
+            "frames": self.frames,
+            "rebuilds": self.rebuilds,
+            "rebuild_seconds": self.rebuild_seconds,
+            "amortized_rebuild_ms": 1000 * self.rebuild_seconds / frames,
+            "amortized_ms": 1000 * self.total_seconds / frames,
+            "mean_candidate_pairs": self.candidate_pairs / frames,
+        }
+
+# Selectable collision broad phases, all resolving pairs with physics.resolve_collision
+COLLISION_BACKENDS = {
+    "all_pairs": handle_collisions,
+    "grid": handle_collisions_grid,
+    "sweep_and_prune": SweepAndPrune(),
+    "neighbor_list": NeighborList(),
+}
+if NUMBA_AVAILABLE:
+    COLLISION_BACKENDS["jit"] = handle_collisions_jit  # Same pairs and order as all_pairs, compiled
+
+# Backends that can test pairs through the nearest image of a periodic box
+PERIODIC_BACKENDS = ("all_pairs", "neighbor_list")
+
+# Pairs overlapping by more than tolerance times their contact distance, and the smallest distance
+# between touching particles as a fraction of their contact distance (1.0 when none touch)
+def overlaps(particles, tolerance=0.1, box=None):
+    x, y, _, radius = particle_arrays(particles)
+    if len(x) < 2:
+        return 0, 1.0
+    first, second = close_pairs(x, y, radius, 0.0, box)
+    dx = x[second] - x[first]
+    dy = y[second] - y[first]
+    dx, dy = minimum_image(dx, dy, box)
+    separation = np.hypot(dx, dy) / (radius[first] + radius[second])
+    return int(np.count_nonzero(separation < 1 - tolerance)), float(separation.min(initial=1.0))
+
+# Handle collisions between particles using the chosen broad phase. Passing the last time step
+# first resolves the contacts made during it (physics.sweep_collisions), then the backend resolves
+# the pairs still touching; passing a periodic box (width, height) needs one of PERIODIC_BACKENDS.
+def compute_collisions(particles, backend="all_pairs", time_step=None, box=None):
+    if backend not in COLLISION_BACKENDS:
+        raise ValueError(f"Unknown collision backend: {backend!r}")
+    if box is not None and backend not in PERIODIC_BACKENDS:
+        raise ValueError(f"Periodic boundaries are not supported by the {backend!r} backend")
+    if time_step is not None:
+        sweep_collisions(particles, time_step, box)
+    if box is not None:
+        COLLISION_BACKENDS[backend](particles, box=box)
+        return
+    COLLISION_BACKENDS[backend](particles)
+
+# Benchmark the broad phases on particles drifting under their own velocities
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    from physics import (
+        EPSILON, initialize_particles, max_speed, update_particles, handle_wall_collisions,
+    )
+
+    steps = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"{'count':>7} {'radius':>6} {'backend':>16} {'ms/step':>9}")
+    for count, radius in ((100, 5), (1000, 5), (5000, 3), (20000, 2)):
+        for backend in COLLISION_BACKENDS:
+            if backend == "all_pairs" and count > 1000:
+                continue  # Quadratic, too slow to be useful here
+            random.seed(0)
+            particles = initialize_particles(count, radius)
+            particles.vx[:] = [random.uniform(-1, 1) for _ in range(count)]
+            particles.vy[:] = [random.uniform(-1, 1) for _ in range(count)]
+            collide = COLLISION_BACKENDS[backend]
+            elapsed = 0.0
+            for _ in range(steps):
+                update_particles(particles, min(5, radius / (max_speed(particles) + EPSILON)))
+                start = time.perf_counter()
+                collide(particles)
+                elapsed += time.perf_counter() - start
+                handle_wall_collisions(particles)
+            print(f"{count:>7} {radius:>6} {backend:>16} {1000 * elapsed / steps:>9.2f}")
@@ -0,0 +1,131 @@
+import heapq
+import math
+
+import numpy as np
+
+from physics import DAMPING_WALL, HEIGHT, WIDTH, X_WALL, Y_WALL, resolve_collision
+
+# Event-driven hard spheres: no forces, particles fly straight between collisions. The next
+# particle-particle and particle-wall contacts are kept in a priority queue and the simulation
+# jumps from one to the next, so nothing happens between events and nothing tunnels.
+class EventDrivenSimulation:
+    def __init__(self, particles):
+        self.particles = particles  # A ParticleStore
+        self.time = 0.0
+        self.queue = []  # (time, i, j, collisions of i, collisions of j) with j a particle or a wall
+        self.collisions = np.zeros(len(particles), dtype=np.int64)  # Per particle, to spot outdated events
+        self.pair_events = 0
+        self.wall_events = 0
+        self.stale_events = 0
+        for i in range(len(particles)):
+            self._predict(i, later_only=True)
+
+    # Queue the upcoming contacts of particle i; with later_only, only against particles j > i
+    def _predict(self, i, later_only=False):
+        p = self.particles
+        start = i + 1 if later_only else 0
+        dx = p.x[start:] - p.x[i]
+        dy = p.y[start:] - p.y[i]
+        dvx = p.vx[start:] - p.vx[i]
+        dvy = p.vy[start:] - p.vy[i]
+        approach = dx * dvx + dy * dvy  # Negative while the pair closes in
+        speed_squared = dvx * dvx + dvy * dvy
+        gap = dx * dx + dy * dy - (p.radius[start:] + p.radius[i]) ** 2
+        discriminant = approach * approach - speed_squared * gap
+
+        hits = (approach < 0) & (discriminant >= 0)
+        if not later_only:
+            hits[i] = False
+        # Smaller root of |d + dv t| = r1 + r2, in the form that avoids cancellation
+        times = gap[hits] / (np.sqrt(discriminant[hits]) - approach[hits])
+        for j, delay in zip((np.flatnonzero(hits) + start).tolist(), times.tolist()):
+            heapq.heappush(self.queue, (self.time + max(delay, 0.0), i, j, self.collisions[i], self.collisions[j]))
+
+        for wall, position, velocity, size in ((X_WALL, p.x[i], p.vx[i], WIDTH), (Y_WALL, p.y[i], p.vy[i], HEIGHT)):
+            if velocity < 0:
+                delay = (p.radius[i] - position) / velocity
+            elif velocity > 0:
+                delay = (size - p.radius[i] - position) / velocity
+            else:
+                continue
+            heapq.heappush(self.queue, (self.time + max(delay, 0.0), i, wall, self.collisions[i], 0))
+
+    # Move every particle along its velocity up to the given time
+    def _drift(self, time):
+        p = self.particles
+        p.x += p.vx * (time - self.time)
+        p.y += p.vy * (time - self.time)
+        self.time = time
+
+    # Bounce off a wall with the damping of handle_wall_collisions
+    def _bounce(self, i, wall):
+        p = self.particles
+        if wall == X_WALL:
+            p.vx[i] = -p.vx[i] * DAMPING_WALL
+            p.x[i] = p.radius[i] if p.x[i] < WIDTH / 2 else WIDTH - p.radius[i]
+        else:
+            p.vy[i] = -p.vy[i] * DAMPING_WALL
+            p.y[i] = p.radius[i] if p.y[i] < HEIGHT / 2 else HEIGHT - p.radius[i]
+
+    # Process every event up to the given duration from now, then drift to the end of it
+    def advance(self, duration):
+        end = self.time + duration
+        p = self.particles
+        while self.queue and self.queue[0][0] <= end:
+            time, i, j, collisions_i, collisions_j = heapq.heappop(self.queue)
+            if collisions_i != self.collisions[i] or (j >= 0 and collisions_j != self.collisions[j]):
+                self.stale_events += 1  # One of the particles has collided since this was predicted
+                continue
+
+            self._drift(time)
+            if j >= 0:
+                dx = p.x[j] - p.x[i]
+                dy = p.y[j] - p.y[i]
+                resolve_collision(p[i], p[j], dx, dy, math.sqrt(dx * dx + dy * dy))
+                self.pair_events += 1
+            else:
+                self._bounce(i, j)
+                self.wall_events += 1
+
+            for k in (i, j) if j >= 0 else (i,):
+                self.collisions[k] += 1
+                self._predict(k)
+        self._drift(end)
+
+    @property
+    def events(self):
+        return self.pair_events + self.wall_events
+
+# Compare with time stepping the collision and wall stages over the same simulated time
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    from collisions import compute_collisions
+    from physics import EPSILON, initialize_particles, max_speed, update_particles, handle_wall_collisions
+
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print(f"{'count':>7} {'radius':>6} {'engine':>8} {'steps/events':>13} {'time (s)':>9}")
+    for count, radius in ((100, 5), (1000, 3), (2000, 2)):
+        random.seed(0)
+        particles = initialize_particles(count, radius)
+        particles.vx[:] = [random.uniform(-1, 1) for _ in range(count)]
+        particles.vy[:] = [random.uniform(-1, 1) for _ in range(count)]
+
+        stepped = particles.copy()
+        start = time.perf_counter()
+        simulated, steps = 0.0, 0
+        while simulated < duration:
+            time_step = min(5, radius / (max_speed(stepped) + EPSILON), duration - simulated)
+            update_particles(stepped, time_step)
+            compute_collisions(stepped, "grid")
+            handle_wall_collisions(stepped)
+            simulated += time_step
+            steps += 1
+        print(f"{count:>7} {radius:>6} {'stepping':>8} {steps:>13} {time.perf_counter() - start:>9.3f}")
+
+        start = time.perf_counter()
+        simulation = EventDrivenSimulation(particles)
+        simulation.advance(duration)
+        print(f"{count:>7} {radius:>6} {'events':>8} {simulation.events:>13} {time.perf_counter() - start:>9.3f}")
@@ -0,0 +1,204 @@
+import functools
+import math
+
+import numpy as np
+
+from barnes_hut import _expand
+from physics import EPSILON, K_COULOMB, MAX_FORCE
+
+# Constants
+ORDER = 5  # Chebyshev nodes per axis in each box expansion
+LEAF_SIZE = 32  # Target particles per leaf box
+MAX_LEVEL = 8  # Finest quadtree level, 4**MAX_LEVEL leaf boxes
+
+# Chebyshev nodes on [-1, 1]
+def _nodes(order):
+    return np.cos((2 * np.arange(order) + 1) * np.pi / (2 * order))
+
+# Interpolation weights S(node_m, t) of points t in [-1, 1]: shape (len(t), order)
+def _weights(order, t):
+    nodes = _nodes(order)
+    n = np.arange(1, order)
+    terms = np.cos(n * np.arccos(np.clip(t, -1, 1))[:, np.newaxis])  # T_n(t)
+    node_terms = np.cos(n[:, np.newaxis] * np.arccos(nodes))  # T_n(node_m)
+    return 1 / order + (2 / order) * terms @ node_terms
+
+# 2D weights of points (u, v) in [-1, 1]², nodes indexed as m_x * order + m_y
+def _weights_2d(order, u, v):
+    wu = _weights(order, u)
+    wv = _weights(order, v)
+    return (wu[:, :, np.newaxis] * wv[:, np.newaxis, :]).reshape(len(u), order * order)
+
+# Parent node values from child node values for the child in quadrant (a, b), as parent = child @ matrix
+@functools.lru_cache(maxsize=16)
+def _child_to_parent(order, a, b):
+    nodes = _nodes(order)
+    # Child nodes in parent coordinates: the child spans [-1, 0] or [0, 1] on each axis
+    u = np.repeat((nodes + 2 * a - 1) / 2, order)
+    v = np.tile((nodes + 2 * b - 1) / 2, order)
+    return _weights_2d(order, u, v)
+
+# Pair force a unit source exerts on a target at displacement (dx, dy) from it, for equal masses
+def _kernel(dx, dy, strength):
+    distance_squared = dx * dx + dy * dy + EPSILON
+    distance = np.sqrt(distance_squared)
+    force = np.minimum(strength / distance_squared, MAX_FORCE) / distance
+    return force * dx, force * dy
+
+# Far-field translation for each box offset (-3..3 on each axis) at the given box width:
+# local field (x then y at every target node) = source node values @ matrix
+@functools.lru_cache(maxsize=4 * MAX_LEVEL)
+def _interaction_matrices(order, width, strength):
+    nodes = _nodes(order) * width / 2
+    node_x = np.repeat(nodes, order)
+    node_y = np.tile(nodes, order)
+    matrices = np.zeros((7, 7, order * order, 2 * order * order))
+    for ox in range(-3, 4):
+        for oy in range(-3, 4):
+            if max(abs(ox), abs(oy)) < 2:
+                continue  # Neighbours are summed directly
+            dx = ox * width + node_x[:, np.newaxis] - node_x[np.newaxis, :]  # [source, target]
+            dy = oy * width + node_y[:, np.newaxis] - node_y[np.newaxis, :]
+            kx, ky = _kernel(dx, dy, strength)
+            matrices[ox + 3, oy + 3] = np.concatenate((kx, ky), axis=1)
+    return matrices
+
+# Exact forces between particles in neighbouring leaf boxes (including their own box)
+def _near_forces(xs, ys, rs, leaf_x, leaf_y, cells, strength):
+    n = len(xs)
+    box = leaf_x * cells + leaf_y
+    box_count = np.bincount(box, minlength=cells * cells)
+    box_start = np.cumsum(box_count) - box_count
+    fx = np.zeros(n)
+    fy = np.zeros(n)
+    for ox in (-1, 0, 1):
+        for oy in (-1, 0, 1):
+            nx, ny = leaf_x + ox, leaf_y + oy
+            valid = (nx >= 0) & (nx < cells) & (ny >= 0) & (ny < cells)
+            owner = np.flatnonzero(valid)
+            neighbour = nx[valid] * cells + ny[valid]
+            p, j = _expand(owner, box_start[neighbour], box_count[neighbour])
+            dx = xs[j] - xs[p]
+            dy = ys[j] - ys[p]
+            distance_squared = dx * dx + dy * dy + EPSILON
+            distance = np.sqrt(distance_squared)
+            force = np.minimum(strength / distance_squared, MAX_FORCE)
+            force[(distance < rs[p] + rs[j]) | (p == j)] = 0  # Skip overlapping particles and self
+            force /= distance
+            fx += np.bincount(p, weights=force * dx, minlength=n)
+            fy += np.bincount(p, weights=force * dy, minlength=n)
+    return fx, fy
+
+# Fast multipole backend on a uniform quadtree. Each box carries the kernel-independent (Chebyshev)
+# expansion: its particles are represented by values at order x order interpolation nodes, passed
+# up the tree (M2M), translated between well-separated boxes (M2L), passed down (L2L) and
+# interpolated back onto the particles (L2P). Neighbouring leaf boxes are summed exactly, so the
+# overlap rule holds. Error falls geometrically with the order; all particles must have the same mass.
+def fmm_forces(x, y, mass, radius, order=ORDER, leaf_size=LEAF_SIZE):
+    count = len(x)
+    fx = np.zeros(count)
+    fy = np.zeros(count)
+    if count < 2:
+        return fx, fy
+    if mass.min() != mass.max():
+        raise ValueError("The FMM backend needs particles of equal mass")
+    strength = K_COULOMB * float(mass[0]) ** 2
+
+    # Root square around the particles; leaves hold about leaf_size particles and are at least
+    # one diameter wide, so particles in separated boxes can never overlap
+    x0, y0 = x.min(), y.min()
+    side = max(x.max() - x0, y.max() - y0, EPSILON) * (1 + 1e-9)
+    levels = min(max(0, math.ceil(math.log(count / leaf_size, 4))), MAX_LEVEL)
+    if radius.max() > 0:
+        levels = min(levels, max(0, int(math.log2(side / (2 * radius.max())))))
+    cells = 1 << levels
+    width = side / cells
+    leaf_x = np.minimum(((x - x0) / width).astype(np.intp), cells - 1)
+    leaf_y = np.minimum(((y - y0) / width).astype(np.intp), cells - 1)
+
+    ordering = np.lexsort((leaf_y, leaf_x))
+    xs, ys, rs = x[ordering], y[ordering], radius[ordering]
+    leaf_x, leaf_y = leaf_x[ordering], leaf_y[ordering]
+    near_x, near_y = _near_forces(xs, ys, rs, leaf_x, leaf_y, cells, strength)
+    fx[ordering] = near_x
+    fy[ordering] = near_y
+    if levels < 2:
+        return fx, fy  # Every box neighbours every other one
+
+    # P2M: particles onto their leaf's nodes
+    nodes = order * order
+    u = 2 * (xs - x0) / width - 2 * leaf_x - 1  # Position within the leaf, in [-1, 1]
+    v = 2 * (ys - y0) / width - 2 * leaf_y - 1
+    weights = _weights_2d(order, u, v)
+    multipoles = [None] * (levels + 1)
+    leaf = np.zeros((cells * cells, nodes))
+    np.add.at(leaf, leaf_x * cells + leaf_y, weights)
+    multipoles[levels] = leaf.reshape(cells, cells, nodes)
+
+    # M2M: up to level 2, the coarsest with well-separated boxes
+    for level in range(levels, 2, -1):
+        child = multipoles[level]
+        half = child.shape[0] // 2
+        parent = np.zeros((half, half, nodes))
+        for a in (0, 1):
+            for b in (0, 1):
+                parent += child[a::2, b::2] @ _child_to_parent(order, a, b)
+        multipoles[level - 1] = parent
+
+    # M2L on each level, then L2L down to the next
+    local = None
+    for level in range(2, levels + 1):
+        size = 1 << level
+        if local is None:
+            local = np.zeros((size, size, 2 * nodes))
+        else:
+            refined = np.zeros((size, size, 2, nodes))
+            coarse = local.reshape(size // 2, size // 2, 2, nodes)
+            for a in (0, 1):
+                for b in (0, 1):
+                    refined[a::2, b::2] = coarse @ _child_to_parent(order, a, b).T
+            local = refined.reshape(size, size, 2 * nodes)
+
+        matrices = _interaction_matrices(order, side / size, strength)
+        padded = np.zeros((size + 6, size + 6, nodes))
+        padded[3:-3, 3:-3] = multipoles[level]
+        half = size // 2
+        for a in (0, 1):
+            for b in (0, 1):
+                # Interaction list: children of the parent's neighbours that are not our neighbours
+                for ox in range(-2 - a, 4 - a):
+                    for oy in range(-2 - b, 4 - b):
+                        if max(abs(ox), abs(oy)) < 2:
+                            continue
+                        sources = padded[3 + a + ox::2, 3 + b + oy::2][:half, :half]
+                        local[a::2, b::2] += sources @ matrices[ox + 3, oy + 3]
+
+    # L2P: interpolate each leaf's field at its particles
+    field = local[leaf_x, leaf_y].reshape(count, 2, nodes)
+    fx[ordering] += np.einsum("nk,nk->n", field[:, 0], weights)
+    fy[ordering] += np.einsum("nk,nk->n", field[:, 1], weights)
+    return fx, fy
+
+# Error (against the direct sum on a sample) and timing report for a range of expansion orders
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    from forces import compare_force_backends, pairwise_forces_tiled
+    from physics import initialize_particles, particle_arrays
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    random.seed(0)
+    particles = initialize_particles(count, 2)
+    arrays = particle_arrays(particles)
+    start = time.perf_counter()
+    pairwise_forces_tiled(*arrays, symmetric=True)
+    print(f"direct sum: {time.perf_counter() - start:.3f} s")
+    print(f"{'order':>6} {'max rel':>10} {'rms rel':>10} {'time (s)':>9}")
+    for order in (2, 3, 4, 5, 6, 8):
+        start = time.perf_counter()
+        fmm_forces(*arrays, order=order)
+        elapsed = time.perf_counter() - start
+        report = compare_force_backends(particles, "fmm", sample=1000, order=order)
+        print(f"{order:>6} {report['max_rel_error']:>10.2e} {report['rms_rel_error']:>10.2e} {elapsed:>9.3f}")
@@ -0,0 +1,316 @@
+import functools
+import glob
+
+import numpy as np
+
+from barnes_hut import barnes_hut_forces
+from collisions import close_pairs
+from fmm import fmm_forces
+from jit import NUMBA_AVAILABLE, jit_forces
+from parallel import parallel_forces
+from particle_mesh import particle_mesh_forces
+from physics import (
+    EPSILON, K_COULOMB, MAX_FORCE, Particle,
+    add_forces, compute_all_pairwise_forces, minimum_image, particle_arrays,
+)
+
+# Constants
+CUTOFF = 50.0  # Interaction range of the short-range force model
+SWITCH_START = 0.8  # Fraction of the cutoff where the switching function starts to fade the force out
+
+# Reference backend: run the scalar loop on temporary particles
+def pairwise_forces_python(x, y, mass, radius):
+    particles = [Particle(*values) for values in zip(x.tolist(), y.tolist(), mass.tolist(), radius.tolist())]
+    compute_all_pairwise_forces(particles)
+    fx = np.array([p.fx for p in particles], dtype=np.float64)
+    fy = np.array([p.fy for p in particles], dtype=np.float64)
+    return fx, fy
+
+# Vectorized backend: all pairs at once as N x N arrays
+def pairwise_forces_numpy(x, y, mass, radius):
+    # dx[i, j] points from particle i towards particle j
+    dx = x[np.newaxis, :] - x[:, np.newaxis]
+    dy = y[np.newaxis, :] - y[:, np.newaxis]
+    distance_squared = dx * dx + dy * dy + EPSILON
+    distance = np.sqrt(distance_squared)
+
+    force = K_COULOMB * mass[:, np.newaxis] * mass[np.newaxis, :] / distance_squared
+    np.minimum(force, MAX_FORCE, out=force)
+    force[distance < radius[:, np.newaxis] + radius[np.newaxis, :]] = 0  # Skip overlapping particles
+    np.fill_diagonal(force, 0)  # No self-interaction
+
+    force /= distance
+    fx = (force * dx).sum(axis=1)
+    fy = (force * dy).sum(axis=1)
+    return fx, fy
+
+# Summed pair force of the periodic images (kx * width, ky * height) of a particle for |kx|, |ky| <= images,
+# apart from the nearest one, tabulated over the offsets (dx, dy) of the nearest image
+@functools.lru_cache(maxsize=8)
+def _image_force_table(strength, box, images, resolution=128):
+    width, height = box
+    dx = np.linspace(-width / 2, width / 2, resolution + 1)[np.newaxis, :]
+    dy = np.linspace(-height / 2, height / 2, max(2, round(resolution * height / width)) + 1)[:, np.newaxis]
+    table_x = np.zeros(np.broadcast(dx, dy).shape)
+    table_y = np.zeros_like(table_x)
+    for kx in range(-images, images + 1):
+        for ky in range(-images, images + 1):
+            if kx == ky == 0:
+                continue
+            image_x = dx + kx * width
+            image_y = dy + ky * height
+            distance_squared = image_x * image_x + image_y * image_y
+            distance = np.sqrt(distance_squared)
+            force = np.minimum(strength / distance_squared, MAX_FORCE) / distance
+            table_x += force * image_x
+            table_y += force * image_y
+    return table_x, table_y
+
+# Force of the farther images for nearest-image offsets dx, dy, by bilinear interpolation in the table
+def image_forces(dx, dy, strength, box, images):
+    table_x, table_y = _image_force_table(strength, box, images)
+    rows, columns = table_x.shape
+    u = np.clip((dx / box[0] + 0.5) * (columns - 1), 0, columns - 1)
+    v = np.clip((dy / box[1] + 0.5) * (rows - 1), 0, rows - 1)
+    column = np.minimum(u.astype(np.intp), columns - 2)
+    row = np.minimum(v.astype(np.intp), rows - 2)
+    u -= column
+    v -= row
+
+    def interpolate(table):
+        top = table[row, column] * (1 - u) + table[row, column + 1] * u
+        bottom = table[row + 1, column] * (1 - u) + table[row + 1, column + 1] * u
+        return top * (1 - v) + bottom * v
+
+    return interpolate(table_x), interpolate(table_y)
+
+# Check the options of a periodic force evaluation and return the pair strength the image table is built for
+def periodic_strength(mass, box, images):
+    if images and box is None:
+        raise ValueError("Image sums need a periodic box")
+    if images and len(mass) and mass.min() != mass.max():
+        raise ValueError("Image sums need particles of equal mass")
+    return K_COULOMB * float(mass[0]) ** 2 if images and len(mass) else 0.0
+
+# Add the forces between a block of rows and a block of columns (both slices) into fx and fy.
+# With symmetric set only pairs j > i are computed, and the reaction is added to the column particles.
+# With a periodic box (width, height) pairs interact through their nearest image, plus the summed
+# farther images up to `images` boxes away (see periodic_strength for the strength).
+def add_block_forces(x, y, mass, radius, rows, columns, fx, fy, symmetric=False, box=None, images=0, strength=0.0):
+    dx = x[np.newaxis, columns] - x[rows, np.newaxis]
+    dy = y[np.newaxis, columns] - y[rows, np.newaxis]
+    dx, dy = minimum_image(dx, dy, box)
+    distance_squared = dx * dx + dy * dy + EPSILON
+    distance = np.sqrt(distance_squared)
+
+    force = K_COULOMB * mass[rows, np.newaxis] * mass[np.newaxis, columns] / distance_squared
+    np.minimum(force, MAX_FORCE, out=force)
+    force[distance < radius[rows, np.newaxis] + radius[np.newaxis, columns]] = 0  # Skip overlapping particles
+    excluded = None
+    if columns.start < rows.stop and rows.start < columns.stop:  # Block touches the diagonal
+        i = np.arange(rows.start, rows.stop)[:, np.newaxis]
+        j = np.arange(columns.start, columns.stop)[np.newaxis, :]
+        excluded = j <= i if symmetric else j == i
+        force[excluded] = 0
+
+    force /= distance
+    pair_fx = force * dx
+    pair_fy = force * dy
+    if images:
+        image_fx, image_fy = image_forces(dx, dy, strength, box, images)
+        if excluded is not None:
+            image_fx[excluded] = 0
+            image_fy[excluded] = 0
+        pair_fx += image_fx
+        pair_fy += image_fy
+    fx[rows] += pair_fx.sum(axis=1)
+    fy[rows] += pair_fy.sum(axis=1)
+    if symmetric:
+        fx[columns] -= pair_fx.sum(axis=0)
+        fy[columns] -= pair_fy.sum(axis=0)
+
+# Forces on the target particles (an index array) from all particles, in blocks of at most tile x tile pairs
+def pairwise_forces_on(x, y, mass, radius, targets, tile=None):
+    tile = tile or tile_size()
+    fx = np.zeros(len(targets))
+    fy = np.zeros(len(targets))
+    for row in range(0, len(targets), tile):
+        rows = slice(row, row + tile)
+        i = targets[rows, np.newaxis]
+        for column in range(0, len(x), tile):
+            columns = slice(column, min(column + tile, len(x)))
+            dx = x[np.newaxis, columns] - x[i]
+            dy = y[np.newaxis, columns] - y[i]
+            distance_squared = dx * dx + dy * dy + EPSILON
+            distance = np.sqrt(distance_squared)
+
+            force = K_COULOMB * mass[i] * mass[np.newaxis, columns] / distance_squared
+            np.minimum(force, MAX_FORCE, out=force)
+            force[distance < radius[i] + radius[np.newaxis, columns]] = 0  # Skip overlapping particles
+            force[i == np.arange(columns.start, columns.stop)[np.newaxis, :]] = 0  # No self-interaction
+
+            force /= distance
+            fx[rows] += (force * dx).sum(axis=1)
+            fy[rows] += (force * dy).sum(axis=1)
+    return fx, fy
+
+# Size of the L2 cache in bytes from sysfs, or a conservative guess where that is not available
+def _l2_cache_bytes(default=256 * 1024):
+    for path in glob.glob("/sys/devices/system/cpu/cpu0/cache/index*"):
+        try:
+            with open(path + "/level") as f:
+                level = f.read().strip()
+            with open(path + "/size") as f:
+                size = f.read().strip()
+        except OSError:
+            continue
+        if level == "2":
+            units = {"K": 1024, "M": 1024 * 1024}
+            return int(size[:-1]) * units[size[-1]] if size[-1] in units else int(size)
+    return default
+
+# Block width whose tile x tile temporaries (about eight float64 arrays per block) fit in the L2 cache
+@functools.lru_cache(maxsize=None)
+def tile_size():
+    tile = int((_l2_cache_bytes() / (8 * 8)) ** 0.5)
+    return max(32, tile // 32 * 32)
+
+# Tiled backend: the N x N interaction matrix in tile x tile blocks, so memory stays O(N + tile²).
+# With symmetric set only blocks on or above the diagonal are computed, each pair once (Newton's third law).
+# With box (and images) set it is periodic, see add_block_forces.
+def pairwise_forces_tiled(x, y, mass, radius, tile=None, symmetric=False, box=None, images=0):
+    tile = tile or tile_size()
+    strength = periodic_strength(mass, box, images)
+    count = len(x)
+    fx = np.zeros(count)
+    fy = np.zeros(count)
+    for row in range(0, count, tile):
+        rows = slice(row, min(row + tile, count))
+        for column in range(row if symmetric else 0, count, tile):
+            columns = slice(column, min(column + tile, count))
+            add_block_forces(x, y, mass, radius, rows, columns, fx, fy, symmetric, box, images, strength)
+    return fx, fy
+
+# Pair forces the tiled kernel evaluates, counting the masked-out half of the diagonal blocks
+def tiled_pair_evaluations(count, tile=None, symmetric=False):
+    tile = tile or tile_size()
+    if not symmetric:
+        return count * count
+    sizes = [min(tile, count - row) for row in range(0, count, tile)]
+    return sum(size * sum(sizes[index:]) for index, size in enumerate(sizes))
+
+# Short-range force model: pairs farther apart than cutoff do not interact, and the force is smoothed
+# so it reaches zero continuously. smoothing="switch" fades it out between SWITCH_START * cutoff and
+# cutoff; smoothing="shifted" subtracts the force at the cutoff. Close pairs come from a cell list,
+# so the cost is O(N) at fixed density. pairs, candidate (first, second) arrays covering every pair
+# within the cutoff, lets a neighbor list built for the collisions stand in for the cell list.
+def cutoff_forces(x, y, mass, radius, cutoff=CUTOFF, smoothing="switch", box=None, images=0, pairs=None):
+    if smoothing not in ("switch", "shifted"):
+        raise ValueError(f"Unknown smoothing: {smoothing!r}")
+    if images:
+        raise ValueError("A short-range force model only interacts with the nearest image")
+    if box is not None and 2 * cutoff > min(box):
+        raise ValueError("The cutoff must be at most half the periodic box")
+    count = len(x)
+    fx = np.zeros(count)
+    fy = np.zeros(count)
+    if count < 2:
+        return fx, fy
+    first, second = pairs if pairs is not None else close_pairs(x, y, np.zeros(count), cutoff, box)
+    dx = x[second] - x[first]
+    dy = y[second] - y[first]
+    dx, dy = minimum_image(dx, dy, box)
+    distance_squared = dx * dx + dy * dy + EPSILON
+    distance = np.sqrt(distance_squared)
+    strength = K_COULOMB * mass[first] * mass[second]
+    force = np.minimum(strength / distance_squared, MAX_FORCE)
+    if smoothing == "switch":
+        s = np.clip((distance - SWITCH_START * cutoff) / ((1 - SWITCH_START) * cutoff), 0, 1)
+        force *= 1 - s * s * (3 - 2 * s)
+    else:
+        force -= np.minimum(strength / (cutoff * cutoff + EPSILON), MAX_FORCE)
+    force[(distance < radius[first] + radius[second]) | (distance >= cutoff)] = 0  # Skip overlapping and distant pairs
+    force /= distance
+    pair_fx = force * dx
+    pair_fy = force * dy
+    fx += np.bincount(first, pair_fx, count) - np.bincount(second, pair_fx, count)
+    fy += np.bincount(first, pair_fy, count) - np.bincount(second, pair_fy, count)
+    return fx, fy
+
+# Selectable force backends, all taking (x, y, mass, radius) and returning (fx, fy)
+FORCE_BACKENDS = {
+    "python": pairwise_forces_python,
+    "numpy": pairwise_forces_numpy,
+    "barnes_hut": barnes_hut_forces,  # Option: theta, the opening angle
+    "fmm": fmm_forces,  # Options: order, the expansion order, and leaf_size
+    "tiled": pairwise_forces_tiled,  # Options: tile, the block width (default sized to the L2 cache), symmetric
+    "tiled_symmetric": functools.partial(pairwise_forces_tiled, symmetric=True),
+    "parallel": parallel_forces,  # Options: processes, min_count, box, images
+    "particle_mesh": particle_mesh_forces,  # Options: cell, the mesh spacing, and cutoff, in cells
+    "cutoff": cutoff_forces,  # Short-range model. Options: cutoff, smoothing, box, pairs
+}
+
+# Backends that take the periodic options box and images
+PERIODIC_BACKENDS = ("tiled", "tiled_symmetric", "parallel", "cutoff")
+if NUMBA_AVAILABLE:
+    FORCE_BACKENDS["jit"] = jit_forces
+
+# Accumulate forces onto the particles using the chosen backend
+def compute_forces(particles, backend="python", **options):
+    if backend not in FORCE_BACKENDS:
+        raise ValueError(f"Unknown force backend: {backend!r}")
+    if backend == "python":
+        compute_all_pairwise_forces(particles)  # Scalar path works on the particles directly
+        return
+    fx, fy = FORCE_BACKENDS[backend](*particle_arrays(particles), **options)
+    add_forces(particles, fx, fy)
+
+# Compare a backend against a reference backend on the same particles. With sample, only that many
+# randomly chosen particles are checked, against the exact sum on them, so large counts stay cheap.
+def compare_force_backends(particles, backend, reference="python", rtol=1e-9, sample=None, seed=0, **options):
+    arrays = particle_arrays(particles)
+    fx, fy = FORCE_BACKENDS[backend](*arrays, **options)
+    if sample is not None and sample < len(fx):
+        targets = np.random.default_rng(seed).choice(len(fx), sample, replace=False)
+        fx, fy = fx[targets], fy[targets]
+        ref_fx, ref_fy = pairwise_forces_on(*arrays, targets)
+        reference = "direct"
+    else:
+        ref_fx, ref_fy = FORCE_BACKENDS[reference](*arrays)
+
+    error = np.hypot(fx - ref_fx, fy - ref_fy)
+    magnitude = np.hypot(ref_fx, ref_fy)
+    relative_error = error / np.maximum(magnitude, EPSILON)
+    atol = rtol * MAX_FORCE  # Rounding noise scales with the clamped pair force
+    return {
+        "backend": backend,
+        "reference": reference,
+        "count": len(error),
+        "max_abs_error": float(error.max(initial=0.0)),
+        "max_rel_error": float(relative_error.max(initial=0.0)),
+        "rms_rel_error": float(np.sqrt(np.mean(relative_error ** 2))) if len(error) else 0.0,
+        "matches": bool(np.all(error <= atol + rtol * magnitude)),
+    }
+
+# Work and timing report: full-matrix kernels against the upper-triangle (symmetric) one
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    from physics import initialize_particles
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    random.seed(0)
+    arrays = particle_arrays(initialize_particles(count, 5))
+    full = count * count
+    print(f"{'kernel':>16} {'pairs':>12} {'vs full':>8} {'time (s)':>9}")
+    for backend, pairs in (
+        ("numpy", full),
+        ("tiled", tiled_pair_evaluations(count)),
+        ("tiled_symmetric", tiled_pair_evaluations(count, symmetric=True)),
+    ):
+        start = time.perf_counter()
+        FORCE_BACKENDS[backend](*arrays)
+        elapsed = time.perf_counter() - start
+        print(f"{backend:>16} {pairs:>12} {pairs / full:>8.1%} {elapsed:>9.3f}")
@@ -0,0 +1,198 @@
+import argparse
+import functools
+import random
+import time
+
+import jit
+from physics import (
+    EPSILON, HEIGHT, TIME_STEP, WIDTH, initialize_particles, kinetic_energy, max_acceleration, max_speed,
+    potential_energy, handle_wall_collisions, sweep_collisions, wrap_positions,
+)
+from forces import CUTOFF, FORCE_BACKENDS, PERIODIC_BACKENDS, compute_forces
+from collisions import COLLISION_BACKENDS, NeighborList, compute_collisions, overlaps
+from integrators import INTEGRATORS, BlockTimeStepper, EulerIntegrator, make_integrator
+from profiler import FrameProfiler
+
+STAGES = ("forces", "integrate", "collisions", "walls")
+
+# Run the physics pipeline without pygame, as fast as possible
+def run_headless(particle_count, radius, steps, seed=None, force_backend="numpy", collision_backend="grid", profiler=None,
+                 use_jit=False, integrator="euler", track_energy=False, block_steps=False, continuous=False,
+                 periodic=False, images=0, cutoff=CUTOFF, smoothing="switch", check_overlaps=False):
+    random.seed(seed)
+    # Block time steps sum the forces on each active subset with the tiled kernel (forces.pairwise_forces_on)
+    if block_steps and force_backend != "tiled":
+        raise ValueError("Block time steps compute forces with the tiled kernel, use force backend 'tiled'")
+    if block_steps and continuous:
+        raise ValueError("Block time steps pick their own steps and do not support swept collision tests")
+    # The JIT update kernel is a semi-implicit Euler step
+    if use_jit and integrator != "euler":
+        raise ValueError(f"The JIT kernels only cover the 'euler' integrator, not {integrator!r}")
+    # potential_energy is the full-range potential, not the cut and smoothed one
+    if track_energy and force_backend == "cutoff":
+        raise ValueError("Energy tracking measures the full-range potential and does not apply to the cutoff model")
+    # Periodic boundaries: nearest-image forces and collisions, positions wrap instead of hitting walls
+    box = (WIDTH, HEIGHT) if periodic else None
+    force_options = {}
+    if periodic:
+        if force_backend not in PERIODIC_BACKENDS or block_steps:
+            raise ValueError(f"Periodic boundaries need one of the force backends {PERIODIC_BACKENDS}")
+        force_options = {"box": box, "images": images}
+    if force_backend == "cutoff":
+        force_options.update(cutoff=cutoff, smoothing=smoothing)
+    forces = functools.partial(compute_forces, backend=force_backend, **force_options)
+    # The short-range model and the neighbor list broad phase share one list of close pairs
+    broad_phase = COLLISION_BACKENDS[collision_backend]
+    shared = force_backend == "cutoff" and collision_backend == "neighbor_list"
+    if shared:
+        broad_phase = NeighborList(cutoff=cutoff)
+
+        def forces(particles):
+            compute_forces(particles, backend="cutoff", pairs=broad_phase.pairs(particles, box), **force_options)
+    stepper = make_integrator(integrator, forces)
+    # The JIT kernels replace the array versions of the Euler update and the wall stage
+    if use_jit:
+        stepper = EulerIntegrator(update=jit.update_particles)
+    walls = jit.handle_wall_collisions if use_jit else handle_wall_collisions
+    # Block time steps replace the integrator and the global time step, and compute forces themselves
+    if block_steps:
+        stepper = BlockTimeStepper(functools.partial(compute_collisions, backend=collision_backend), walls)
+    particles = initialize_particles(particle_count, radius)
+    profiler = profiler or FrameProfiler()
+    simulated_time = 0.0
+    if track_energy:
+        initial_energy = kinetic_energy(particles) + potential_energy(particles)
+    acceleration = 0.0  # Largest acceleration of the previous step, for the continuous time step
+    overlapping = []  # Per step, with check_overlaps: pairs overlapping by over 10% of their contact distance
+    min_separation = 1.0  # Smallest distance between touching particles as a fraction of their contact distance
+
+    start = time.perf_counter()
+    for _ in range(steps):
+        profiler.start_frame()
+        if block_steps:
+            stepper.step(particles, profiler)
+            profiler.end_frame()
+            simulated_time += stepper.max_step
+            continue
+        if continuous:
+            # Swept tests catch the contacts, so only keep the position error from acceleration below a radius
+            time_step = min(TIME_STEP, (2 * radius / (acceleration + EPSILON)) ** 0.5)
+        else:
+            time_step = min(5, radius / (max_speed(particles) + EPSILON))
+        stepper.begin(particles, time_step)
+        profiler.lap("integrate")
+        forces(particles)
+        acceleration = max_acceleration(particles)
+        profiler.lap("forces")
+        stepper.finish(particles, time_step)
+        profiler.lap("integrate")
+        if shared:
+            if continuous:
+                sweep_collisions(particles, time_step, box)
+            broad_phase(particles, box)
+        else:
+            compute_collisions(particles, collision_backend, time_step if continuous else None, box)
+        profiler.lap("collisions")
+        if periodic:
+            wrap_positions(particles, box)
+        elif continuous:
+            handle_wall_collisions(particles, time_step)
+        else:
+            walls(particles)
+        profiler.lap("walls")
+        if check_overlaps:
+            pairs, separation = overlaps(particles, box=box)
+            overlapping.append(pairs)
+            min_separation = min(min_separation, separation)
+        profiler.end_frame()
+        simulated_time += time_step
+    elapsed = time.perf_counter() - start
+
+    stats = {
+        "particle_count": particle_count,
+        "radius": radius,
+        "steps": steps,
+        "seed": seed,
+        "force_backend": force_backend,
+        "collision_backend": collision_backend,
+        "use_jit": use_jit,
+        # Stages that actually ran compiled: block steps integrate themselves, and periodic or swept
+        # runs have no wall stage or use the swept one
+        "jit_stages": [
+            stage for stage, compiled in (("integrate", not block_steps), ("walls", not periodic and not continuous))
+            if use_jit and compiled
+        ],
+        "integrator": integrator,
+        "block_steps": block_steps,
+        "continuous": continuous,
+        "periodic": periodic,
+        "images": images,
+        "cutoff": cutoff if force_backend == "cutoff" else None,
+        "smoothing": smoothing if force_backend == "cutoff" else None,
+        "shared_neighbor_list": shared,
+        "elapsed": elapsed,
+        "steps_per_second": steps / elapsed if elapsed > 0 else float("inf"),
+        "simulated_time": simulated_time,
+        "stage_seconds": {stage: profiler.totals.get(stage, 0.0) for stage in STAGES},
+        "profile": profiler.summary(),
+    }
+    if hasattr(broad_phase, "stats"):
+        stats["collision_stats"] = broad_phase.stats()  # Such as neighbor list rebuilds
+    if check_overlaps:
+        stats["overlaps"] = {
+            "max_pairs": max(overlapping, default=0),
+            "mean_pairs": sum(overlapping) / max(1, len(overlapping)),
+            "min_separation": min_separation,
+        }
+    if block_steps:
+        stats["substeps"] = stepper.substeps
+        stats["active_fraction"] = stepper.force_evaluations / max(1, stepper.substeps * particle_count)
+    if track_energy:
+        # Change in total energy as a fraction of the potential energy available at the start
+        final_energy = kinetic_energy(particles) + potential_energy(particles)
+        stats["energy_drift"] = (final_energy - initial_energy) / abs(initial_energy) if initial_energy else 0.0
+    return particles, stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the particle simulation without a display.")
+    parser.add_argument("count", type=int, help="number of particles")
+    parser.add_argument("radius", type=float, help="particle radius")
+    parser.add_argument("steps", type=int, help="number of physics steps")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--forces", choices=FORCE_BACKENDS, default="numpy")
+    parser.add_argument("--collisions", choices=COLLISION_BACKENDS, default="grid")
+    parser.add_argument("--integrator", choices=INTEGRATORS, default="euler")
+    parser.add_argument("--energy", action="store_true", help="report the energy drift over the run")
+    parser.add_argument("--block-steps", action="store_true", help="use per-particle block time steps (needs --forces tiled)")
+    parser.add_argument("--continuous", action="store_true",
+                        help="swept collision tests, time step from accelerations only")
+    parser.add_argument("--overlaps", action="store_true",
+                        help="report the particle pairs left overlapping after each step")
+    parser.add_argument("--periodic", action="store_true", help="periodic boundaries instead of walls")
+    parser.add_argument("--images", type=int, default=0, help="periodic image shells summed beyond the nearest image")
+    parser.add_argument("--cutoff", type=float, default=CUTOFF, help="interaction range of --forces cutoff")
+    parser.add_argument("--smoothing", choices=("switch", "shifted"), default="switch",
+                        help="how --forces cutoff brings the force to zero at the cutoff")
+    parser.add_argument("--jit", action="store_true", help="integrate and handle walls with the JIT kernels (needs --integrator euler)")
+    args = parser.parse_args()
+
+    _, stats = run_headless(args.count, args.radius, args.steps, args.seed, args.forces, args.collisions,
+                            use_jit=args.jit, integrator=args.integrator, track_energy=args.energy,
+                            block_steps=args.block_steps, continuous=args.continuous,
+                            periodic=args.periodic, images=args.images, cutoff=args.cutoff,
+                            smoothing=args.smoothing, check_overlaps=args.overlaps)
+    print(f"{stats['steps']} steps in {stats['elapsed']:.3f} s ({stats['steps_per_second']:.1f} steps/s)")
+    if "collision_stats" in stats:
+        print("  " + ", ".join(f"{name} {value:.4g}" for name, value in stats["collision_stats"].items()))
+    if args.block_steps:
+        print(f"  {stats['substeps']} substeps, {stats['active_fraction']:.1%} of particles active per substep")
+    if args.overlaps:
+        print("  overlapping pairs (over 10% of contact) max {max_pairs}, mean {mean_pairs:.2f}; "
+              "closest contact {min_separation:.2f} of the contact distance".format(**stats["overlaps"]))
+    if args.energy:
+        print(f"  energy drift {stats['energy_drift']:+.3e} over {stats['simulated_time']:.1f} time units")
+    for stage, seconds in stats["stage_seconds"].items():
+        print(f"  {stage:<10} {1000 * seconds / stats['steps']:8.3f} ms/step")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import numpy as np
+
+from physics import EPSILON, TIME_STEP, particle_arrays, update_particles
+from forces import pairwise_forces_on
+
+# Constants
+MAX_LEVEL = 10  # Finest block step is TIME_STEP / 2**MAX_LEVEL
+
+# An integrator advances a ParticleStore in two halves around the force evaluation:
+#   integrator.begin(particles, time_step)   before forces are accumulated into fx, fy
+#   integrator.finish(particles, time_step)  after, leaving fx, fy reset to zero
+# so that each step needs exactly one force evaluation. Integrators are built with the pipeline's
+# force function, forces(particles), for schemes that need forces before the first step.
+
+# Semi-implicit Euler, the original update_particles: kick with the new force, then drift
+class EulerIntegrator:
+    def __init__(self, forces=None, update=update_particles):
+        self.update = update  # Lets the JIT kernel stand in for the array version
+
+    def reset(self):
+        pass
+
+    def begin(self, particles, time_step):
+        pass
+
+    def finish(self, particles, time_step):
+        self.update(particles, time_step)
+
+# Velocity-Verlet: drift with the acceleration kept from the previous step, then kick with the average
+class VelocityVerletIntegrator:
+    def __init__(self, forces):
+        self.forces = forces
+        self.ax = self.ay = None  # Acceleration at the current positions, from the last force evaluation
+
+    def reset(self):
+        self.ax = self.ay = None
+
+    def begin(self, particles, time_step):
+        if self.ax is None:
+            # First step (or after a reset): one extra evaluation for the starting acceleration
+            self.forces(particles)
+            self.ax = particles.fx / particles.mass
+            self.ay = particles.fy / particles.mass
+            particles.fx[:] = 0
+            particles.fy[:] = 0
+        particles.x += particles.vx * time_step + 0.5 * self.ax * time_step * time_step
+        particles.y += particles.vy * time_step + 0.5 * self.ay * time_step * time_step
+
+    def finish(self, particles, time_step):
+        ax = particles.fx / particles.mass
+        ay = particles.fy / particles.mass
+        particles.vx += 0.5 * (self.ax + ax) * time_step
+        particles.vy += 0.5 * (self.ay + ay) * time_step
+        self.ax, self.ay = ax, ay
+        particles.fx[:] = 0  # Reset forces
+        particles.fy[:] = 0
+
+# Leapfrog in drift-kick-drift form: forces are evaluated at the half-step positions
+class LeapfrogIntegrator:
+    def __init__(self, forces=None):
+        pass
+
+    def reset(self):
+        pass
+
+    def begin(self, particles, time_step):
+        particles.x += 0.5 * particles.vx * time_step
+        particles.y += 0.5 * particles.vy * time_step
+
+    def finish(self, particles, time_step):
+        particles.vx += (particles.fx / particles.mass) * time_step
+        particles.vy += (particles.fy / particles.mass) * time_step
+        particles.x += 0.5 * particles.vx * time_step
+        particles.y += 0.5 * particles.vy * time_step
+        particles.fx[:] = 0  # Reset forces
+        particles.fy[:] = 0
+
+# Hierarchical block time steps: each particle advances with its own power-of-two fraction of
+# max_step, chosen from its speed and acceleration, and only particles at the end of their step get
+# new forces. Kick-drift-kick leapfrog per particle, with everyone drifted between step boundaries.
+class BlockTimeStepper:
+    def __init__(self, collide, walls, max_step=TIME_STEP, max_level=MAX_LEVEL):
+        self.collide = collide  # collide(particles) and walls(particles) run after every drift
+        self.walls = walls
+        self.max_step = max_step
+        self.max_level = max_level
+        self.ax = self.ay = None  # Acceleration of each particle from its last force evaluation
+        self.substeps = 0  # Drifts between step boundaries
+        self.force_evaluations = 0  # Particles whose forces were computed, summed over substeps
+
+    def reset(self):
+        self.ax = self.ay = None
+
+    def _update_accelerations(self, particles, targets):
+        fx, fy = pairwise_forces_on(*particle_arrays(particles), targets)
+        self.ax[targets] = fx / particles.mass[targets]
+        self.ay[targets] = fy / particles.mass[targets]
+        self.force_evaluations += len(targets)
+
+    # Step of each target particle in ticks of max_step / 2**max_level, aligned with the current tick
+    def _strides(self, particles, targets, tick):
+        radius = particles.radius[targets]
+        speed = np.hypot(particles.vx[targets], particles.vy[targets])
+        acceleration = np.hypot(self.ax[targets], self.ay[targets])
+        # Move at most one radius per step, from the velocity and from the acceleration
+        time_step = np.minimum(radius / (speed + EPSILON), np.sqrt(2 * radius / (acceleration + EPSILON)))
+        level = np.clip(np.ceil(np.log2(self.max_step / time_step)), 0, self.max_level).astype(np.int64)
+        stride = 2 ** (self.max_level - level)
+        # A particle can only move to a coarser step at a tick that step divides, so it stays in sync
+        misaligned = tick % stride != 0
+        while misaligned.any():
+            stride[misaligned] //= 2
+            misaligned = tick % stride != 0
+        return stride
+
+    # Advance every particle by max_step; all particles are synchronized again at the end
+    def step(self, particles, profiler=None):
+        lap = profiler.lap if profiler else lambda name: None
+        count = len(particles)
+        if not count:
+            return
+        ticks = 2 ** self.max_level
+        tick_time = self.max_step / ticks
+        if self.ax is None:
+            self.ax = np.zeros(count)
+            self.ay = np.zeros(count)
+            self._update_accelerations(particles, np.arange(count))
+            lap("forces")
+
+        stride = self._strides(particles, np.arange(count), 0)
+        end = stride.copy()  # Tick at which each particle's current step ends
+        particles.vx += 0.5 * self.ax * stride * tick_time  # Opening half kick
+        particles.vy += 0.5 * self.ay * stride * tick_time
+        tick = 0
+        while tick < ticks:
+            next_tick = int(end.min())
+            particles.x += particles.vx * (next_tick - tick) * tick_time
+            particles.y += particles.vy * (next_tick - tick) * tick_time
+            lap("integrate")
+            self.collide(particles)
+            lap("collisions")
+            self.walls(particles)
+            lap("walls")
+            tick = next_tick
+            self.substeps += 1
+
+            active = np.flatnonzero(end == tick)
+            self._update_accelerations(particles, active)
+            lap("forces")
+            time_step = stride[active] * tick_time
+            particles.vx[active] += 0.5 * self.ax[active] * time_step  # Closing half kick
+            particles.vy[active] += 0.5 * self.ay[active] * time_step
+            if tick < ticks:
+                stride[active] = self._strides(particles, active, tick)
+                end[active] = tick + stride[active]
+                time_step = stride[active] * tick_time
+                particles.vx[active] += 0.5 * self.ax[active] * time_step  # Opening half kick of the next step
+                particles.vy[active] += 0.5 * self.ay[active] * time_step
+            lap("integrate")
+
+# Selectable integrators; each run needs its own instance since Verlet keeps state between steps
+INTEGRATORS = {
+    "euler": EulerIntegrator,
+    "verlet": VelocityVerletIntegrator,
+    "leapfrog": LeapfrogIntegrator,
+}
+
+def make_integrator(name, forces):
+    if name not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator: {name!r}")
+    return INTEGRATORS[name](forces)
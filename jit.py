@@ -0,0 +1,135 @@
+import math
+
+import numpy as np
+
+from physics import (
+    DAMPING_OBJECT, DAMPING_WALL, EPSILON, HEIGHT, K_COULOMB, MAX_FORCE, TIME_STEP, WIDTH, ParticleStore,
+)
+
+# Numba is optional: without it these kernels still run, as (slow) plain Python
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_AVAILABLE = numba is not None
+
+if NUMBA_AVAILABLE:
+    # Compiled on first call; cache=True keeps the machine code on disk for later launches
+    jit = numba.njit(cache=True)
+else:
+    def jit(function):
+        return function
+
+# Same loop as physics.compute_all_pairwise_forces, accumulating into fx and fy
+@jit
+def _pairwise_forces(x, y, mass, radius, fx, fy):
+    n = len(x)
+    for i in range(n - 1):
+        for j in range(i + 1, n):
+            dx = x[j] - x[i]
+            dy = y[j] - y[i]
+            distance_squared = dx * dx + dy * dy + EPSILON
+            distance = math.sqrt(distance_squared)
+
+            if distance < radius[i] + radius[j]:
+                continue  # Skip overlapping particles
+
+            force = min(K_COULOMB * mass[i] * mass[j] / distance_squared, MAX_FORCE)
+            pair_fx = force * dx / distance
+            pair_fy = force * dy / distance
+            fx[i] += pair_fx
+            fy[i] += pair_fy
+            fx[j] -= pair_fx
+            fy[j] -= pair_fy
+
+# Same loop as physics.handle_collisions with physics.resolve_collision inlined
+@jit
+def _collisions(x, y, vx, vy, mass, radius):
+    n = len(x)
+    for i in range(n - 1):
+        for j in range(i + 1, n):
+            dx = x[j] - x[i]
+            dy = y[j] - y[i]
+            distance = math.sqrt(dx * dx + dy * dy)
+            if distance >= radius[i] + radius[j]:
+                continue
+
+            # Separate the pair along the contact normal
+            overlap = radius[i] + radius[j] - distance
+            inv_distance = 1 / distance if distance > 0 else 0.0
+            normal_x = dx * inv_distance
+            normal_y = dy * inv_distance
+            x[i] -= normal_x * overlap / 2
+            y[i] -= normal_y * overlap / 2
+            x[j] += normal_x * overlap / 2
+            y[j] += normal_y * overlap / 2
+
+            # Exchange momentum along the normal, keep the tangential components
+            tangent_x = -normal_y
+            tangent_y = normal_x
+            v1n = vx[i] * normal_x + vy[i] * normal_y
+            v2n = vx[j] * normal_x + vy[j] * normal_y
+            v1t = vx[i] * tangent_x + vy[i] * tangent_y
+            v2t = vx[j] * tangent_x + vy[j] * tangent_y
+            m1, m2 = mass[i], mass[j]
+            v1n_new = ((v1n * (m1 - m2) + 2 * m2 * v2n) / (m1 + m2)) * DAMPING_OBJECT
+            v2n_new = ((v2n * (m2 - m1) + 2 * m1 * v1n) / (m1 + m2)) * DAMPING_OBJECT
+            vx[i] = v1t * tangent_x + v1n_new * normal_x
+            vy[i] = v1t * tangent_y + v1n_new * normal_y
+            vx[j] = v2t * tangent_x + v2n_new * normal_x
+            vy[j] = v2t * tangent_y + v2n_new * normal_y
+
+@jit
+def _update(x, y, vx, vy, fx, fy, mass, time_step):
+    for i in range(len(x)):
+        vx[i] += (fx[i] / mass[i]) * time_step
+        vy[i] += (fy[i] / mass[i]) * time_step
+        x[i] += vx[i] * time_step
+        y[i] += vy[i] * time_step
+        fx[i] = 0.0  # Reset forces
+        fy[i] = 0.0
+
+@jit
+def _walls(x, y, vx, vy, radius):
+    for i in range(len(x)):
+        if x[i] - radius[i] < 0:  # Left wall
+            vx[i] = -vx[i] * DAMPING_WALL
+            x[i] = radius[i]
+        elif x[i] + radius[i] > WIDTH:  # Right wall
+            vx[i] = -vx[i] * DAMPING_WALL
+            x[i] = WIDTH - radius[i]
+
+        if y[i] - radius[i] < 0:  # Top wall
+            vy[i] = -vy[i] * DAMPING_WALL
+            y[i] = radius[i]
+        elif y[i] + radius[i] > HEIGHT:  # Bottom wall
+            vy[i] = -vy[i] * DAMPING_WALL
+            y[i] = HEIGHT - radius[i]
+
+# Run a kernel on the store arrays in place; a list of particles goes through a temporary store
+def _run_on_store(kernel, particles, *fields, extra=()):
+    store = particles if isinstance(particles, ParticleStore) else ParticleStore.from_particles(particles)
+    kernel(*(getattr(store, name) for name in fields), *extra)
+    if store is not particles:
+        for p, view in zip(particles, store):
+            for name in fields:
+                setattr(p, name, getattr(view, name))
+
+# Force backend: (x, y, mass, radius) -> (fx, fy) with O(N) memory
+def jit_forces(x, y, mass, radius):
+    fx = np.zeros(len(x))
+    fy = np.zeros(len(x))
+    _pairwise_forces(x, y, mass, radius, fx, fy)
+    return fx, fy
+
+# Collision backend: all pairs in the same order as physics.handle_collisions
+def handle_collisions_jit(particles):
+    _run_on_store(_collisions, particles, "x", "y", "vx", "vy", "mass", "radius")
+
+# Drop-in replacements for physics.update_particles and physics.handle_wall_collisions
+def update_particles(particles, time_step=TIME_STEP):
+    _run_on_store(_update, particles, "x", "y", "vx", "vy", "fx", "fy", "mass", extra=(float(time_step),))
+
+def handle_wall_collisions(particles):
+    _run_on_store(_walls, particles, "x", "y", "vx", "vy", "radius")
@@ -0,0 +1,136 @@
+import atexit
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Constants
+MIN_PARALLEL_COUNT = 2000  # Below this the pool overhead outweighs the pair work
+
+_attached = {}  # Pool worker side: name -> SharedMemory of the buffer this process last used
+
+# CPUs this process may run on, which can be fewer than the machine has (e.g. in a restricted container)
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# Views onto one flat float64 memory block: the inputs (x, y, mass, radius), then one (fx, fy) accumulator per task
+def _buffer_arrays(buffer, capacity, tasks):
+    inputs = np.ndarray((4, capacity), dtype=np.float64, buffer=buffer)
+    accumulators = np.ndarray((tasks, 2, capacity), dtype=np.float64, buffer=buffer, offset=inputs.nbytes)
+    return inputs, accumulators
+
+def _buffer_bytes(capacity, tasks):
+    return 8 * capacity * (4 + 2 * tasks)
+
+# Row boundaries splitting the pairs (i, j > i) into parts with about the same number of pairs each
+def _balanced_rows(count, parts):
+    rows = np.arange(count + 1)
+    pairs_before = rows * (2 * count - 1 - rows) // 2  # Row i pairs with the count - 1 - i particles after it
+    bounds = np.searchsorted(pairs_before, pairs_before[-1] * np.arange(parts + 1) / parts)
+    bounds[-1] = count
+    return bounds.tolist()
+
+# Pool task: forces of the pairs (i, j > i) with row_start <= i < row_end, into the task's own accumulator
+def _pair_range_forces(name, capacity, tasks, count, task, row_start, row_end, box, images, strength):
+    from forces import add_block_forces, tile_size  # Imported here because forces imports this module
+
+    memory = _attached.get(name)
+    if memory is None:
+        for old in _attached.values():
+            old.close()
+        _attached.clear()
+        memory = _attached[name] = shared_memory.SharedMemory(name=name)
+    inputs, accumulators = _buffer_arrays(memory.buf, capacity, tasks)
+    x, y, mass, radius = inputs[:, :count]
+    fx, fy = accumulators[task, :, :count]
+    fx[:] = 0
+    fy[:] = 0
+
+    tile = tile_size()
+    for start in range(row_start, row_end, tile):
+        rows = slice(start, min(start + tile, row_end))
+        for column in range(start, count, tile):
+            columns = slice(column, min(column + tile, count))
+            add_block_forces(x, y, mass, radius, rows, columns, fx, fy, True, box, images, strength)
+
+# Process pool splitting the pairwise force sum by rows, with inputs and accumulators in shared memory
+class ForcePool:
+    def __init__(self, processes=None):
+        self.processes = processes or available_cpus()
+        self.pool = None
+        self.memory = None
+        self.capacity = 0  # Particles the shared buffer has room for
+
+    # Make sure the shared buffer holds count particles, growing it if needed
+    def _reserve(self, count):
+        if count <= self.capacity:
+            return
+        self._release_memory()
+        self.memory = shared_memory.SharedMemory(create=True, size=_buffer_bytes(count, self.processes))
+        self.capacity = count
+
+    def _release_memory(self):
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+            self.capacity = 0
+
+    def forces(self, x, y, mass, radius, box=None, images=0):
+        from forces import periodic_strength
+
+        strength = periodic_strength(mass, box, images)
+        count = len(x)
+        self._reserve(count)
+        if self.pool is None:
+            # Started after the first buffer, so the workers share our shared memory tracker
+            self.pool = multiprocessing.Pool(self.processes)
+        inputs, accumulators = _buffer_arrays(self.memory.buf, self.capacity, self.processes)
+        for row, values in zip(inputs, (x, y, mass, radius)):
+            row[:count] = values
+
+        bounds = _balanced_rows(count, self.processes)
+        tasks = [
+            (self.memory.name, self.capacity, self.processes, count, task, bounds[task], bounds[task + 1],
+             box, images, strength)
+            for task in range(self.processes)
+        ]
+        self.pool.starmap(_pair_range_forces, tasks)
+        fx = accumulators[:, 0, :count].sum(axis=0)
+        fy = accumulators[:, 1, :count].sum(axis=0)
+        del inputs, accumulators  # Release the views so the buffer can be closed
+        return fx, fy
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        self._release_memory()
+
+_pool = None
+
+def _close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+atexit.register(_close_pool)
+
+# Force backend: pairs split across a shared process pool, single-process for small counts
+def parallel_forces(x, y, mass, radius, processes=None, min_count=MIN_PARALLEL_COUNT, box=None, images=0):
+    global _pool
+    processes = processes or available_cpus()
+    # Daemonic processes (such as the physics worker) are not allowed to start a pool
+    if len(x) < min_count or processes < 2 or multiprocessing.current_process().daemon:
+        from forces import pairwise_forces_tiled
+        return pairwise_forces_tiled(x, y, mass, radius, symmetric=True, box=box, images=images)
+
+    if _pool is None or _pool.processes != processes:
+        _close_pool()
+        _pool = ForcePool(processes)
+    return _pool.forces(x, y, mass, radius, box, images)
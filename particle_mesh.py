@@ -0,0 +1,124 @@
+import functools
+
+import numpy as np
+
+from collisions import close_pairs
+from physics import EPSILON, HEIGHT, K_COULOMB, MAX_FORCE, WIDTH
+
+# Constants
+CUTOFF_CELLS = 3.0  # Short-range split radius in mesh cells
+
+# Share of the pair force handled by the mesh: 0 at contact, rising smoothly to 1 at the cutoff
+def _long_range_share(distance, cutoff):
+    s = np.minimum(distance / cutoff, 1.0)
+    return s * s * (3 - 2 * s)
+
+# Pair force magnitude without the overlap rule, as in the direct sum
+def _pair_force(distance_squared, strength):
+    return np.minimum(strength / distance_squared, MAX_FORCE)
+
+# Fourier transform of the long-range pair force over the grid displacements, zero-padded to twice the
+# grid so the convolution does not wrap around. Entry [a, b] holds the force a unit mass at displacement
+# (a, b) cells pulls towards, with the sign flipped so that the convolution gives the force on the receiver.
+@functools.lru_cache(maxsize=4)
+def _kernel_spectrum(cells_x, cells_y, cell, strength, cutoff):
+    shape = (2 * cells_x, 2 * cells_y)
+    offset_x = np.fft.fftfreq(shape[0], 1 / shape[0])[:, np.newaxis] * cell
+    offset_y = np.fft.fftfreq(shape[1], 1 / shape[1])[np.newaxis, :] * cell
+    distance_squared = offset_x * offset_x + offset_y * offset_y
+    distance = np.sqrt(distance_squared)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        force = _pair_force(distance_squared, strength) * _long_range_share(distance, cutoff) / distance
+    force[0, 0] = 0
+    # Keep the kernel odd: the most negative displacement has no positive partner
+    force[cells_x, :] = 0
+    force[:, cells_y] = 0
+    return np.fft.rfft2(-force * offset_x), np.fft.rfft2(-force * offset_y)
+
+# Cloud-in-cell: the grid node below-left of each particle and the particle's weights on its four nodes
+def _cloud_in_cell(x, y, origin_x, origin_y, cell):
+    grid_x = (x - origin_x) / cell
+    grid_y = (y - origin_y) / cell
+    node_x = np.floor(grid_x).astype(np.intp)
+    node_y = np.floor(grid_y).astype(np.intp)
+    tx = grid_x - node_x
+    ty = grid_y - node_y
+    corners = ((0, 0, (1 - tx) * (1 - ty)), (1, 0, tx * (1 - ty)), (0, 1, (1 - tx) * ty), (1, 1, tx * ty))
+    return node_x, node_y, corners
+
+# Particle-particle particle-mesh (P3M) backend. The pair force is split at `cutoff` cells: the smooth
+# long-range part is deposited on a grid (CIC), convolved with FFTs and interpolated back; the
+# short-range part, including the overlap rule, is summed directly over pairs within the cutoff.
+# O(N + G log G) for G grid cells. All particles must have the same mass.
+def particle_mesh_forces(x, y, mass, radius, cell=None, cutoff=CUTOFF_CELLS):
+    count = len(x)
+    fx = np.zeros(count)
+    fy = np.zeros(count)
+    if count < 2:
+        return fx, fy
+    if mass.min() != mass.max():
+        raise ValueError("The particle-mesh backend needs particles of equal mass")
+    strength = K_COULOMB * float(mass[0]) ** 2
+    cell = float(cell or max(np.sqrt(WIDTH * HEIGHT / count), radius.max()))  # About one particle per cell
+    cutoff_distance = max(cutoff * cell, 2 * float(radius.max()))  # Overlapping pairs must be short-range
+
+    # Long range: deposit, convolve, interpolate
+    origin_x, origin_y = x.min(), y.min()
+    cells_x = int((x.max() - origin_x) // cell) + 2
+    cells_y = int((y.max() - origin_y) // cell) + 2
+    node_x, node_y, corners = _cloud_in_cell(x, y, origin_x, origin_y, cell)
+    shape = (2 * cells_x, 2 * cells_y)
+    density = np.zeros(shape)
+    for dx, dy, weight in corners:
+        np.add.at(density, (node_x + dx, node_y + dy), weight)
+    kernel_x, kernel_y = _kernel_spectrum(cells_x, cells_y, cell, strength, cutoff_distance)
+    density_spectrum = np.fft.rfft2(density)
+    field_x = np.fft.irfft2(density_spectrum * kernel_x, s=shape)
+    field_y = np.fft.irfft2(density_spectrum * kernel_y, s=shape)
+    for dx, dy, weight in corners:
+        fx += weight * field_x[node_x + dx, node_y + dy]
+        fy += weight * field_y[node_x + dx, node_y + dy]
+
+    # Short range: the exact pair force minus the mesh's share of it, for pairs within the cutoff
+    first, second = close_pairs(x, y, np.zeros(count), cutoff_distance)
+    dx = x[second] - x[first]
+    dy = y[second] - y[first]
+    distance_squared = dx * dx + dy * dy
+    distance = np.sqrt(distance_squared + EPSILON)
+    exact = _pair_force(distance_squared + EPSILON, strength)
+    exact[distance < radius[first] + radius[second]] = 0  # Skip overlapping particles
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mesh = _pair_force(distance_squared, strength) * _long_range_share(np.sqrt(distance_squared), cutoff_distance)
+    mesh[distance_squared == 0] = 0
+    correction = (exact - mesh) / distance
+    pair_fx = correction * dx
+    pair_fy = correction * dy
+    fx += np.bincount(first, pair_fx, count) - np.bincount(second, pair_fx, count)
+    fy += np.bincount(first, pair_fy, count) - np.bincount(second, pair_fy, count)
+    return fx, fy
+
+# Error and timing report against the exact pairwise sum
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    from forces import FORCE_BACKENDS
+    from physics import initialize_particles, particle_arrays
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    random.seed(0)
+    arrays = particle_arrays(initialize_particles(count, 2))
+    start = time.perf_counter()
+    reference = FORCE_BACKENDS["tiled_symmetric"](*arrays)
+    print(f"direct sum: {time.perf_counter() - start:.3f} s")
+    magnitude = np.hypot(*reference)
+    print(f"{'cell':>6} {'cutoff':>6} {'max rel':>10} {'rms rel':>10} {'time (s)':>9}")
+    for cell in (None, 4.0, 8.0):
+        for cutoff in (2.0, 3.0, 5.0):
+            start = time.perf_counter()
+            fx, fy = particle_mesh_forces(*arrays, cell=cell, cutoff=cutoff)
+            elapsed = time.perf_counter() - start
+            relative = np.hypot(fx - reference[0], fy - reference[1]) / np.maximum(magnitude, EPSILON)
+            label = "auto" if cell is None else f"{cell:g}"
+            print(f"{label:>6} {cutoff:>6g} {relative.max():>10.2e} {np.sqrt(np.mean(relative ** 2)):>10.2e} {elapsed:>9.3f}")
@@ -0,0 +1,467 @@
+import heapq
+import random
+import math
+import itertools
+
+import numpy as np
+
+# Constants
+WIDTH, HEIGHT = 1280, 720
+TIME_STEP = 5  # Time step for updates
+MAX_FORCE = 1e9  # Maximum allowable force for smoother movement
+K_COULOMB = 8.9875e9  # Coulomb's constant (in N·m²/C²)
+DAMPING_WALL = 0.99
+DAMPING_OBJECT = 0.99
+EPSILON = 1e-7  # To avoid division by zero
+X_WALL, Y_WALL = -1, -2  # Walls stand in for the second particle of a collision event
+
+# Particle class
+class Particle:
+    def __init__(self, x, y, mass, radius):
+        self.x = x
+        self.y = y
+        self.mass = mass
+        self.radius = radius
+        self.fx = 0  # Force in x direction
+        self.fy = 0  # Force in y direction
+        self.vx = 0  # Velocity in x direction
+        self.vy = 0  # Velocity in y direction
+
+# Attribute of a ParticleView backed by one of the store arrays
+def _store_field(name):
+    def get(self):
+        return float(getattr(self.store, name)[self.index])
+
+    def set(self, value):
+        getattr(self.store, name)[self.index] = value
+
+    return property(get, set)
+
+# Lightweight handle to one particle inside a ParticleStore, usable wherever a Particle is
+class ParticleView:
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    x = _store_field("x")
+    y = _store_field("y")
+    vx = _store_field("vx")
+    vy = _store_field("vy")
+    fx = _store_field("fx")
+    fy = _store_field("fy")
+    mass = _store_field("mass")
+    radius = _store_field("radius")
+
+    def __eq__(self, other):
+        return isinstance(other, ParticleView) and self.store is other.store and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+# Structure-of-arrays particle storage: one contiguous float array per attribute
+class ParticleStore:
+    FIELDS = ("x", "y", "vx", "vy", "fx", "fy", "mass", "radius")
+
+    def __init__(self, count):
+        for name in self.FIELDS:
+            setattr(self, name, np.zeros(count, dtype=np.float64))
+
+    @classmethod
+    def from_particles(cls, particles):
+        store = cls(len(particles))
+        for name in cls.FIELDS:
+            getattr(store, name)[:] = [getattr(p, name) for p in particles]
+        return store
+
+    def copy(self):
+        store = ParticleStore(0)
+        for name in self.FIELDS:
+            setattr(store, name, getattr(self, name).copy())
+        return store
+
+    def __len__(self):
+        return len(self.x)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("particle index out of range")
+        return ParticleView(self, index)
+
+    def __iter__(self):
+        return (ParticleView(self, i) for i in range(len(self)))
+
+# Initializing particles
+def initialize_particles(count, radius):
+    particles = ParticleStore(count)
+    particles.mass[:] = 1e12  # Assign same mass to all particles
+    particles.radius[:] = radius
+    for i in range(count):
+        particles.x[i] = random.uniform(radius, WIDTH - radius)
+        particles.y[i] = random.uniform(radius, HEIGHT - radius)
+    return particles
+
+# Gather positions, masses and radii into float arrays for the array backends
+def particle_arrays(particles):
+    if isinstance(particles, ParticleStore):
+        return particles.x, particles.y, particles.mass, particles.radius  # Already contiguous
+    n = len(particles)
+    x = np.fromiter((p.x for p in particles), dtype=np.float64, count=n)
+    y = np.fromiter((p.y for p in particles), dtype=np.float64, count=n)
+    mass = np.fromiter((p.mass for p in particles), dtype=np.float64, count=n)
+    radius = np.fromiter((p.radius for p in particles), dtype=np.float64, count=n)
+    return x, y, mass, radius
+
+# Accumulate force arrays back onto the particles
+def add_forces(particles, fx, fy):
+    if isinstance(particles, ParticleStore):
+        particles.fx += fx
+        particles.fy += fy
+        return
+    for p, fx_i, fy_i in zip(particles, fx.tolist(), fy.tolist()):
+        p.fx += fx_i
+        p.fy += fy_i
+
+# Compute pairwise forces
+def compute_all_pairwise_forces(particles):
+    for i in range(len(particles) - 1):
+        for j in range(i + 1, len(particles)):
+            p1, p2 = particles[i], particles[j]
+            dx = p2.x - p1.x
+            dy = p2.y - p1.y
+            distance_squared = dx**2 + dy**2 + EPSILON
+            distance = math.sqrt(distance_squared)
+
+            if distance < p1.radius + p2.radius:
+                continue  # Skip overlapping particles
+
+            force = K_COULOMB * p1.mass * p2.mass / distance_squared
+            force = min(force, MAX_FORCE)
+
+            fx = force * dx / distance
+            fy = force * dy / distance
+
+            p1.fx += fx
+            p1.fy += fy
+            p2.fx -= fx
+            p2.fy -= fy
+
+# Fastest particle speed, used for the adaptive time step
+def max_speed(particles):
+    if isinstance(particles, ParticleStore):
+        return float(np.sqrt(particles.vx ** 2 + particles.vy ** 2).max(initial=0.0))
+    return max((math.sqrt(p.vx ** 2 + p.vy ** 2) for p in particles), default=0.0)
+
+# Largest force-driven acceleration, call before the integrator resets the forces
+def max_acceleration(particles):
+    if isinstance(particles, ParticleStore):
+        return float((np.sqrt(particles.fx ** 2 + particles.fy ** 2) / particles.mass).max(initial=0.0))
+    return max((math.sqrt(p.fx ** 2 + p.fy ** 2) / p.mass for p in particles), default=0.0)
+
+# Total kinetic energy
+def kinetic_energy(particles):
+    if isinstance(particles, ParticleStore):
+        return float(0.5 * np.sum(particles.mass * (particles.vx ** 2 + particles.vy ** 2)))
+    return sum(0.5 * p.mass * (p.vx ** 2 + p.vy ** 2) for p in particles)
+
+# Total potential energy of the pair force, measured from touching pairs: -K m1 m2 / d where the
+# force is below MAX_FORCE, linear where it is clamped, and flat for overlapping pairs (no force)
+def potential_energy(particles, block=256):
+    x, y, mass, radius = particle_arrays(particles)
+    count = len(x)
+
+    def energy(distance, strength, clamp):
+        return np.where(distance >= clamp, -strength / distance, MAX_FORCE * (distance - clamp) - strength / clamp)
+
+    total = 0.0
+    for start in range(0, count, block):
+        rows = slice(start, min(start + block, count))
+        dx = x[np.newaxis, :] - x[rows, np.newaxis]
+        dy = y[np.newaxis, :] - y[rows, np.newaxis]
+        contact = radius[rows, np.newaxis] + radius[np.newaxis, :]
+        distance = np.maximum(np.sqrt(dx * dx + dy * dy), contact)
+        strength = K_COULOMB * mass[rows, np.newaxis] * mass[np.newaxis, :]
+        clamp = np.sqrt(strength / MAX_FORCE)  # Distance below which the force is clamped
+        pair_energy = energy(distance, strength, clamp) - energy(contact, strength, clamp)
+        upper = np.arange(count)[np.newaxis, :] > np.arange(rows.start, rows.stop)[:, np.newaxis]  # Pairs j > i
+        total += float(pair_energy[upper].sum())
+    return total
+
+# Update particles with velocity and forces
+def update_particles(particles, time_step=TIME_STEP):
+    if isinstance(particles, ParticleStore):
+        particles.vx += (particles.fx / particles.mass) * time_step
+        particles.vy += (particles.fy / particles.mass) * time_step
+        particles.x += particles.vx * time_step
+        particles.y += particles.vy * time_step
+        particles.fx[:] = 0  # Reset forces
+        particles.fy[:] = 0
+        return
+    for p in particles:
+        p.vx += (p.fx / p.mass) * time_step
+        p.vy += (p.fy / p.mass) * time_step
+        p.x += p.vx * time_step
+        p.y += p.vy * time_step
+        p.fx = p.fy = 0  # Reset forces
+
+# Separate two overlapping particles and exchange momentum along the contact normal
+def resolve_collision(p1, p2, dx, dy, distance):
+    overlap = p1.radius + p2.radius - distance
+    inv_distance = 1 / distance if distance > 0 else 0
+    resolve_x = dx * inv_distance * overlap / 2
+    resolve_y = dy * inv_distance * overlap / 2
+    p1.x -= resolve_x
+    p1.y -= resolve_y
+    p2.x += resolve_x
+    p2.y += resolve_y
+
+    # Compute normal and tangential directions
+    normal_x = dx * inv_distance
+    normal_y = dy * inv_distance
+    tangent_x = -normal_y
+    tangent_y = normal_x
+
+    # Apply velocities onto normal and tangential directions
+    v1n = p1.vx * normal_x + p1.vy * normal_y
+    v2n = p2.vx * normal_x + p2.vy * normal_y
+    v1t = p1.vx * tangent_x + p1.vy * tangent_y
+    v2t = p2.vx * tangent_x + p2.vy * tangent_y
+
+    # Apply conservation of momentum to normal components
+    m1, m2 = p1.mass, p2.mass
+    v1n_new = ((v1n * (m1 - m2) + 2 * m2 * v2n) / (m1 + m2)) * DAMPING_OBJECT
+    v2n_new = ((v2n * (m2 - m1) + 2 * m1 * v1n) / (m1 + m2)) * DAMPING_OBJECT
+
+    # Updated normal and unchanged tangential components
+    p1.vx = v1t * tangent_x + v1n_new * normal_x
+    p1.vy = v1t * tangent_y + v1n_new * normal_y
+    p2.vx = v2t * tangent_x + v2n_new * normal_x
+    p2.vy = v2t * tangent_y + v2n_new * normal_y
+
+# Time into the last step at which each pair, now at offset (dx, dy), first touched while moving along
+# its current paths since `start`; inf where it did not (apart and closing in at `start` is required)
+def impact_times(dx, dy, dvx, dvy, contact, start, time_step):
+    remaining = time_step - start
+    start_x = dx - dvx * remaining  # Offset at the start of the current paths
+    start_y = dy - dvy * remaining
+    speed_squared = dvx * dvx + dvy * dvy
+    approach = start_x * dvx + start_y * dvy
+    gap = start_x * start_x + start_y * start_y - contact * contact
+    discriminant = approach * approach - speed_squared * gap
+    hits = (approach < 0) & (gap >= 0) & (discriminant >= 0)  # Closing in, apart, and paths that meet
+    with np.errstate(divide="ignore", invalid="ignore"):
+        impact = gap / (np.sqrt(np.maximum(discriminant, 0)) - approach)
+    hits &= impact < remaining
+    return np.where(hits, start + impact, np.inf)
+
+# Offset to the nearest periodic image in a (width, height) box, for scalars or arrays; unchanged without a box
+def minimum_image(dx, dy, box=None):
+    if box is None:
+        return dx, dy
+    if isinstance(dx, np.ndarray):
+        return dx - box[0] * np.round(dx / box[0]), dy - box[1] * np.round(dy / box[1])
+    return dx - box[0] * round(dx / box[0]), dy - box[1] * round(dy / box[1])  # Much faster on Python floats
+
+# Rewind a pair to the moment of contact, collide, and move on for the rest of the step
+def resolve_swept_collision(p1, p2, remaining, box=None):
+    for p in (p1, p2):
+        p.x -= p.vx * remaining
+        p.y -= p.vy * remaining
+    dx, dy = minimum_image(p2.x - p1.x, p2.y - p1.y, box)
+    resolve_collision(p1, p2, dx, dy, math.sqrt(dx**2 + dy**2))
+    for p in (p1, p2):
+        p.x += p.vx * remaining
+        p.y += p.vy * remaining
+
+# Swept test over the last step: find the pairs that touched during it and resolve them in the order
+# they touched. A resolved pair leaves on new paths from the moment of contact, so both particles are
+# tested again against everyone from then on; earlier predictions for them are dropped. Without a
+# periodic box, wall contacts are events too, bouncing with DAMPING_WALL, so a particle coming back
+# off a wall cannot pass through others either. The first predictions only cover the pairs a cell
+# list finds within reach of each other over the step (swept broad phase).
+def sweep_collisions(particles, time_step, box=None):
+    from collisions import close_pairs  # Imported here because collisions imports this module
+
+    count = len(particles)
+    if isinstance(particles, ParticleStore):
+        x, y, vx, vy, radius = particles.x, particles.y, particles.vx, particles.vy, particles.radius
+    else:
+        x, y, vx, vy, radius = (np.array([getattr(p, name) for p in particles], dtype=np.float64)
+                                for name in ("x", "y", "vx", "vy", "radius"))
+    since = np.zeros(count)  # Time into the step from which each particle's current path holds
+    collisions = np.zeros(count, dtype=np.int64)  # Per particle, to spot outdated predictions
+
+    # Impacts of the pairs (first, second) along their current paths; indices, or one particle and a slice
+    def pair_impacts(first, second):
+        dx = x[second] - x[first]
+        dy = y[second] - y[first]
+        dx, dy = minimum_image(dx, dy, box)
+        return impact_times(dx, dy, vx[second] - vx[first], vy[second] - vy[first], radius[first] + radius[second],
+                            np.maximum(since[first], since[second]), time_step)
+
+    # Queue the wall contacts of particle i along its current path, if it was clear of the walls
+    def predict_walls(i):
+        r, begin = float(radius[i]), float(since[i])
+        for wall, position, velocity, size in ((X_WALL, x, vx, WIDTH), (Y_WALL, y, vy, HEIGHT)):
+            end, speed = float(position[i]), float(velocity[i])
+            start = end - speed * (time_step - begin)
+            contact = r if speed < 0 else size - r
+            if r <= start <= size - r and (end < contact if speed < 0 else end > contact):
+                heapq.heappush(queue, (begin + (contact - start) / speed, i, wall, collisions[i], 0))
+
+    # Close pairs and every wall to begin with: (time, i, j, collisions of i, collisions of j), j a particle
+    # or a wall. Two particles close at most 2 * max speed * time_step of their gap during the step.
+    reach = 2 * float(np.sqrt(vx * vx + vy * vy).max(initial=0.0)) * time_step
+    first, second = close_pairs(x, y, radius, reach, box)
+    times = pair_impacts(first, second)
+    hits = np.flatnonzero(times < np.inf)
+    queue = [(time, i, j, 0, 0) for time, i, j in zip(times[hits].tolist(), first[hits].tolist(), second[hits].tolist())]
+    heapq.heapify(queue)
+    if box is None:
+        for i in range(count):
+            predict_walls(i)
+
+    # Queue the impacts of particle i against everyone else and the walls
+    def predict(i):
+        times = pair_impacts(i, slice(None))
+        times[i] = np.inf
+        for j in np.flatnonzero(times < np.inf).tolist():
+            heapq.heappush(queue, (float(times[j]), i, j, collisions[i], collisions[j]))
+        if box is None:
+            predict_walls(i)
+
+    while queue:
+        time, i, j, collisions_i, collisions_j = heapq.heappop(queue)
+        if collisions_i != collisions[i] or (j >= 0 and collisions_j != collisions[j]):
+            continue  # One of the particles has collided since this was predicted
+        remaining = time_step - time
+        if j >= 0:
+            p1, p2 = particles[i], particles[j]
+            resolve_swept_collision(p1, p2, remaining, box)
+            involved = ((i, p1), (j, p2))
+        else:
+            # Bounce at the moment of contact and travel back, damped, for the rest of the step
+            p = particles[i]
+            if j == X_WALL:
+                p.x -= p.vx * remaining
+                p.vx = -p.vx * DAMPING_WALL
+                p.x += p.vx * remaining
+            else:
+                p.y -= p.vy * remaining
+                p.vy = -p.vy * DAMPING_WALL
+                p.y += p.vy * remaining
+            involved = ((i, p),)
+        for k, p in involved:
+            x[k], y[k], vx[k], vy[k] = p.x, p.y, p.vx, p.vy  # No-ops for a ParticleStore
+            since[k] = time
+            collisions[k] += 1
+        for k, _ in involved:
+            predict(k)
+
+# Handle collisions between particles. With the time step of the last update, pairs that touched
+# during it are first resolved in time order (sweep_collisions), then the ones still in contact.
+# With a periodic box, pairs touch through their nearest images.
+def handle_collisions(particles, time_step=None, box=None):
+    if time_step:
+        sweep_collisions(particles, time_step, box)
+    resolve_candidate_pairs(particles, itertools.combinations(range(len(particles)), 2), box)
+
+# Test candidate (i, j) pairs in the given order and resolve the ones in contact
+def resolve_candidate_pairs(particles, pairs, box=None):
+    if not isinstance(particles, ParticleStore):
+        for i, j in pairs:
+            p1, p2 = particles[i], particles[j]
+            dx, dy = minimum_image(p2.x - p1.x, p2.y - p1.y, box)
+            distance = math.sqrt(dx**2 + dy**2)
+            if distance < p1.radius + p2.radius:  # Collision detected
+                resolve_collision(p1, p2, dx, dy, distance)
+        return
+
+    # Read positions from plain lists instead of the arrays, refreshing them after each resolution
+    xs, ys, radii = particles.x.tolist(), particles.y.tolist(), particles.radius.tolist()
+    for i, j in pairs:
+        dx, dy = minimum_image(xs[j] - xs[i], ys[j] - ys[i], box)
+        distance = math.sqrt(dx**2 + dy**2)
+
+        if distance < radii[i] + radii[j]:  # Collision detected
+            p1, p2 = particles[i], particles[j]
+            resolve_collision(p1, p2, dx, dy, distance)
+            xs[i], ys[i], xs[j], ys[j] = p1.x, p1.y, p2.x, p2.y
+
+# Handle collisions with walls. With the time step of the last update, a particle that hit a wall
+# during it (swept test) bounces at the moment of impact and travels back for the rest of the step.
+def handle_wall_collisions(particles, time_step=None):
+    if isinstance(particles, ParticleStore):
+        x, y, radius = particles.x, particles.y, particles.radius
+        left = x - radius < 0
+        right = ~left & (x + radius > WIDTH)
+        top = y - radius < 0
+        bottom = ~top & (y + radius > HEIGHT)
+        if time_step:
+            # Distance travelled past the wall, for particles that were clear of it when the step started
+            overshoot_x = np.where(left, radius - x, x + radius - WIDTH)
+            overshoot_y = np.where(top, radius - y, y + radius - HEIGHT)
+            swept_x = (left | right) & (overshoot_x <= np.abs(particles.vx) * time_step)
+            swept_y = (top | bottom) & (overshoot_y <= np.abs(particles.vy) * time_step)
+        particles.vx[left | right] *= -DAMPING_WALL
+        particles.vy[top | bottom] *= -DAMPING_WALL
+        x[left] = radius[left]
+        x[right] = WIDTH - radius[right]
+        y[top] = radius[top]
+        y[bottom] = HEIGHT - radius[bottom]
+        if time_step:
+            x[swept_x] -= np.sign(x[swept_x] - WIDTH / 2) * overshoot_x[swept_x] * DAMPING_WALL
+            y[swept_y] -= np.sign(y[swept_y] - HEIGHT / 2) * overshoot_y[swept_y] * DAMPING_WALL
+            np.clip(x, radius, WIDTH - radius, out=x)
+            np.clip(y, radius, HEIGHT - radius, out=y)
+        return
+    for p in particles:
+        if time_step:
+            _sweep_wall_collisions(p, time_step)
+            continue
+        if p.x - p.radius < 0:  # Left wall
+            p.vx = -p.vx * DAMPING_WALL
+            p.x = p.radius
+
+        elif p.x + p.radius > WIDTH:  # Right wall
+            p.vx = -p.vx * DAMPING_WALL
+            p.x = WIDTH - p.radius
+
+        if p.y - p.radius < 0:  # Top wall
+            p.vy = -p.vy * DAMPING_WALL
+            p.y = p.radius
+
+        elif p.y + p.radius > HEIGHT:  # Bottom wall
+            p.vy = -p.vy * DAMPING_WALL
+            p.y = HEIGHT - p.radius
+
+# Periodic boundaries: wrap positions back into the box instead of bouncing off walls
+def wrap_positions(particles, box=(WIDTH, HEIGHT)):
+    if isinstance(particles, ParticleStore):
+        np.mod(particles.x, box[0], out=particles.x)
+        np.mod(particles.y, box[1], out=particles.y)
+        return
+    for p in particles:
+        p.x %= box[0]
+        p.y %= box[1]
+
+# Swept wall test for one particle: reflect the distance travelled past a wall during the step
+def _sweep_wall_collisions(p, time_step):
+    for position, velocity, size in (("x", "vx", WIDTH), ("y", "vy", HEIGHT)):
+        value, speed = getattr(p, position), getattr(p, velocity)
+        if value - p.radius < 0:  # Left or top wall
+            wall, overshoot = p.radius, p.radius - value
+        elif value + p.radius > size:  # Right or bottom wall
+            wall, overshoot = size - p.radius, value + p.radius - size
+        else:
+            continue
+        setattr(p, velocity, -speed * DAMPING_WALL)
+        if overshoot <= abs(speed) * time_step:  # Reached the wall during this step
+            value = wall - math.copysign(overshoot * DAMPING_WALL, value - size / 2)
+        else:
+            value = wall
+        setattr(p, position, min(max(value, p.radius), size - p.radius))
+
@@ -0,0 +1,54 @@
+import time
+from collections import deque
+
+import numpy as np
+
+# Rolling per-phase frame timings
+class FrameProfiler:
+    def __init__(self, window=120):
+        self.window = window  # Frames kept per phase
+        self.samples = {}  # Phase name -> deque of seconds per frame
+        self.totals = {}  # Phase name -> seconds over the whole run
+        self.frames = 0
+        self._frame = {}  # Seconds spent in each phase during the current frame
+        self._mark = time.perf_counter()
+
+    # Start timing a new frame
+    def start_frame(self):
+        self._frame = {}
+        self._mark = time.perf_counter()
+
+    # Charge the time since the previous lap to the named phase; a phase may lap several times per frame
+    def lap(self, name):
+        now = time.perf_counter()
+        self._frame[name] = self._frame.get(name, 0.0) + now - self._mark
+        self._mark = now
+
+    # Close the current frame and push its phase timings into the rolling windows
+    def end_frame(self):
+        for name, seconds in self._frame.items():
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+                self.totals[name] = 0.0
+            self.samples[name].append(seconds)
+            self.totals[name] += seconds
+        self._frame = {}
+        self.frames += 1
+
+    # Histogram of a phase's recent frame times in milliseconds, returns (counts, bin_edges)
+    def histogram(self, name, bins=10):
+        return np.histogram(1000 * np.array(self.samples.get(name, ())), bins=bins)
+
+    # Rolling statistics per phase in milliseconds, plus run totals in seconds
+    def summary(self):
+        result = {}
+        for name, samples in self.samples.items():
+            ms = 1000 * np.array(samples)
+            result[name] = {
+                "mean_ms": float(ms.mean()),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p95_ms": float(np.percentile(ms, 95)),
+                "max_ms": float(ms.max()),
+                "total_s": self.totals[name],
+            }
+        return result
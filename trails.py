@@ -0,0 +1,37 @@
+import numpy as np
+
+# Trail points for every particle in one preallocated circular buffer
+class TrailBuffer:
+    def __init__(self, count, max_length):
+        self.points = np.zeros((count, max_length, 3), dtype=np.float64)  # x, y, radius per point
+        self.max_length = max_length
+        self.head = 0  # Slot the next point is written to
+        self.length = 0  # Points stored per particle
+
+    def __len__(self):
+        return self.length
+
+    # Forget all points, keeping the buffer
+    def reset(self):
+        self.head = 0
+        self.length = 0
+
+    # Append the current position of every particle, overwriting the oldest point once full
+    def push(self, x, y, radius):
+        self.points[:, self.head, 0] = x
+        self.points[:, self.head, 1] = y
+        self.points[:, self.head, 2] = radius
+        self.head = (self.head + 1) % self.max_length
+        self.length = min(self.length + 1, self.max_length)
+
+    # Slot of the oldest stored point
+    @property
+    def start(self):
+        return (self.head - self.length) % self.max_length
+
+    # The stored points from oldest to newest as at most two (count, n, 3) views, without copying
+    def segments(self):
+        start = self.start
+        if start + self.length <= self.max_length:
+            return (self.points[:, start:start + self.length],)
+        return self.points[:, start:], self.points[:, :self.head]
@@ -0,0 +1,172 @@
+import functools
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from physics import EPSILON, ParticleStore, max_speed, handle_wall_collisions
+from forces import compute_forces
+from collisions import compute_collisions
+from integrators import make_integrator
+
+# Snapshot layout: two buffers of (x, y, vx, vy) rows, plus a control block
+SNAPSHOT_FIELDS = ("x", "y", "vx", "vy")
+FRONT, SEQUENCE, STEP = 0, 1, 3  # Control slots: front buffer, per-buffer sequence (2), per-buffer step (2)
+CONTROL_SIZE = 5
+
+# Views onto one flat float64/int64 memory block, shared between the renderer and the physics loop
+def _snapshot_arrays(buffer, count):
+    control = np.ndarray((CONTROL_SIZE,), dtype=np.int64, buffer=buffer)
+    state = np.ndarray((2, len(SNAPSHOT_FIELDS), count), dtype=np.float64, buffer=buffer, offset=control.nbytes)
+    return control, state
+
+def _snapshot_bytes(count):
+    return 8 * CONTROL_SIZE + 8 * 2 * len(SNAPSHOT_FIELDS) * count
+
+# Write the particles into the back buffer, then make it the front one
+def _publish(control, state, particles, step):
+    back = 1 - control[FRONT]
+    control[SEQUENCE + back] += 1  # Odd while the buffer is being written
+    for row, name in enumerate(SNAPSHOT_FIELDS):
+        state[back, row] = getattr(particles, name)
+    control[STEP + back] = step
+    control[SEQUENCE + back] += 1
+    control[FRONT] = back
+
+# Commands waiting in the queue; with wait set, block until at least one arrives
+def _pending_commands(commands, wait):
+    try:
+        yield commands.get(block=wait)
+        while True:
+            yield commands.get_nowait()
+    except queue.Empty:
+        return
+
+# Physics pipeline loop, driven by commands from the renderer
+def _physics_loop(control, state, arrays, radius, force_backend, collision_backend, integrator, rate, commands):
+    integrator = make_integrator(integrator, functools.partial(compute_forces, backend=force_backend))
+    particles = ParticleStore(len(arrays["x"]))
+    for name, values in arrays.items():
+        getattr(particles, name)[:] = values
+    dragged = None  # (index, x, y) pinned under the cursor
+    paused = False
+    step = 0
+    interval = 1 / rate if rate else 0.0
+    next_time = time.perf_counter()
+
+    while True:
+        for command, *args in _pending_commands(commands, wait=paused):
+            if command == "stop":
+                return
+            if command == "drag":
+                dragged = args
+            elif command == "release":
+                dragged = None
+            elif command == "pause":
+                paused = args[0]
+            elif command == "reset":
+                for name, values in args[0].items():
+                    getattr(particles, name)[:] = values
+                particles.vx[:] = particles.vy[:] = 0
+                particles.fx[:] = particles.fy[:] = 0
+                integrator.reset()
+        if dragged:
+            particles.x[dragged[0]], particles.y[dragged[0]] = dragged[1], dragged[2]
+        if paused:
+            _publish(control, state, particles, step)  # Show drags and resets while paused
+            continue
+
+        time_step = min(5, radius / (max_speed(particles) + EPSILON))
+        integrator.begin(particles, time_step)
+        compute_forces(particles, force_backend)
+        integrator.finish(particles, time_step)
+        compute_collisions(particles, collision_backend)
+        handle_wall_collisions(particles)
+        if dragged:
+            particles.x[dragged[0]], particles.y[dragged[0]] = dragged[1], dragged[2]
+        step += 1
+        _publish(control, state, particles, step)
+
+        # Pace to the requested rate, without trying to make up for time lost to slow steps
+        if interval:
+            next_time = max(next_time + interval, time.perf_counter() - interval)
+            time.sleep(max(0.0, next_time - time.perf_counter()))
+
+def _process_main(name, count, *args):
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        _physics_loop(*_snapshot_arrays(memory.buf, count), *args)
+    finally:
+        memory.close()
+
+# Runs the physics pipeline in a worker process (or thread) and publishes double-buffered snapshots
+class PhysicsWorker:
+    def __init__(self, particles, radius, force_backend="numpy", collision_backend="grid", rate=60, use_thread=False,
+                 integrator="euler"):
+        count = len(particles)
+        self.count = count
+        arrays = {name: getattr(particles, name).copy() for name in ParticleStore.FIELDS}
+        args = (arrays, radius, force_backend, collision_backend, integrator, rate)
+
+        if use_thread:
+            # Only useful when the backends release the GIL for most of a step
+            self.memory = None
+            self.control, self.state = _snapshot_arrays(bytearray(_snapshot_bytes(count)), count)
+            self.commands = queue.Queue()
+            self.runner = threading.Thread(
+                target=_physics_loop, args=(self.control, self.state, *args, self.commands), daemon=True,
+            )
+        else:
+            self.memory = shared_memory.SharedMemory(create=True, size=_snapshot_bytes(count))
+            self.control, self.state = _snapshot_arrays(self.memory.buf, count)
+            self.control[:] = 0
+            self.commands = multiprocessing.Queue()
+            self.runner = multiprocessing.Process(
+                target=_process_main, args=(self.memory.name, count, *args, self.commands), daemon=True,
+            )
+        _publish(self.control, self.state, particles, 0)
+        self.last_step = -1
+
+    def start(self):
+        self.runner.start()
+        return self
+
+    # Copy the latest snapshot into a store without locking; returns True if it is newer than the last read
+    def read(self, particles):
+        while True:
+            front = int(self.control[FRONT])
+            sequence = int(self.control[SEQUENCE + front])
+            if sequence % 2:
+                continue  # The worker lapped us and is rewriting this buffer
+            for row, name in enumerate(SNAPSHOT_FIELDS):
+                getattr(particles, name)[:] = self.state[front, row]
+            step = int(self.control[STEP + front])
+            if self.control[SEQUENCE + front] == sequence:
+                break
+        is_new = step != self.last_step
+        self.last_step = step
+        return is_new
+
+    def drag(self, index, x, y):
+        self.commands.put(("drag", index, x, y))
+
+    def release(self):
+        self.commands.put(("release",))
+
+    def pause(self, paused):
+        self.commands.put(("pause", paused))
+
+    # Restart the worker from the positions, masses and radii of a freshly initialized store
+    def reset(self, particles):
+        self.commands.put(("reset", {name: getattr(particles, name).copy() for name in ("x", "y", "mass", "radius")}))
+
+    def stop(self):
+        self.commands.put(("stop",))
+        self.runner.join(timeout=5)
+        if self.memory is not None:
+            del self.control, self.state
+            self.memory.close()
+            self.memory.unlink()